@@ -1,6 +1,8 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, Header, HTTPException
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from app.services.matching_service import matching_service
+from app.services.response_cache import response_cache, CachedResponse
 from config import Config
 import asyncio
 import os
@@ -8,38 +10,149 @@ import time
 import httpx 
 
 from app.services.telegram_monitor import TelegramMonitor
+from app.services.media_pipeline import load_message_media
+from app.services.leader_election import LeaderElection
+from app.services.startup import StartupTracker
+from app.services.admission import AdmissionController, AdmissionRejected, LIVE, BACKFILL
+from app.routes import messages, preferences
 
-# Global telegram monitor instance
+# Global telegram monitor instance (only set on the elected leader)
 telegram_monitor = None
+leader_election = None
+snapshot_task = None
+market_stats_task = None
+startup = StartupTracker(timeout=Config.STARTUP_STAGE_TIMEOUT)
+admission = AdmissionController(
+    limit=Config.ADMISSION_LIMIT,
+    queue_sizes={LIVE: Config.ADMISSION_LIVE_QUEUE, BACKFILL: Config.ADMISSION_BACKFILL_QUEUE},
+    deadline=Config.ADMISSION_DEADLINE,
+)
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    global telegram_monitor
-    
-    print("🚀 Starting Message Processing Service...")
+async def _snapshot_loop():
+    """Periodically persist the buyer index so restarts can warm-start from disk"""
+    while True:
+        await asyncio.sleep(Config.BUYER_SNAPSHOT_INTERVAL)
+        try:
+            await matching_service.save_snapshot()
+        except Exception as e:
+            print(f"❌ Buyer snapshot failed: {e}")
+
+async def _market_stats_loop():
+    """Periodically merge this worker's market stats into the shared checkpoint"""
+    while True:
+        await asyncio.sleep(Config.MARKET_STATS_INTERVAL)
+        try:
+            await matching_service.checkpoint_market_stats()
+        except Exception as e:
+            print(f"❌ Market stats checkpoint failed: {e}")
+
+async def _become_leader():
+    """Start the Telegram monitor once this worker wins the election"""
+    global telegram_monitor, snapshot_task
     
     try:
-        # Re-enable Telegram monitor
-        from app.services.telegram_monitor import TelegramMonitor
         telegram_monitor = TelegramMonitor()
         print("✅ Telegram monitor initialized")
         
         # Auto-start the Telegram monitor
         print("🔄 Auto-starting Telegram monitor...")
-        asyncio.create_task(telegram_monitor.start())
+        asyncio.create_task(startup.run("telegram", telegram_monitor.start(), required=False))
         
     except Exception as e:
         print(f"❌ Failed to initialize Telegram monitor: {e}")
         telegram_monitor = None
     
+    # Only the leader sends digests, so each buyer gets one per window
+    matching_service.digests.start()
+    
+    # Only the leader writes the shared buyer snapshot file
+    if Config.BUYER_SNAPSHOT_PATH and Config.BUYER_WATERMARK_COLUMN:
+        snapshot_task = asyncio.create_task(_snapshot_loop())
+
+async def _step_down():
+    """Stop the Telegram monitor after losing the election"""
+    global telegram_monitor, snapshot_task
+    
+    if snapshot_task:
+        snapshot_task.cancel()
+        snapshot_task = None
+    await matching_service.digests.stop()
+    if telegram_monitor and telegram_monitor.is_running:
+        await telegram_monitor.stop()
+    telegram_monitor = None
+
+async def _initialize():
+    """Bring up independent subsystems concurrently, retrying required ones until ready"""
+    global leader_election, market_stats_task
+    
+    # Every worker serves HTTP, only the elected leader runs Telethon
+    leader_election = LeaderElection(
+        Config.LEADER_LOCK_FILE,
+        poll_interval=Config.LEADER_POLL_INTERVAL,
+        use_db_lease=Config.LEADER_DB_LEASE,
+        lease_ttl=Config.LEADER_LEASE_TTL,
+    )
+    
+    await asyncio.gather(
+        startup.run("supabase_pool", matching_service.startup()),
+        startup.run("buyer_cache", matching_service.warm_up()),
+        startup.run("leader_election", leader_election.start(_become_leader, _step_down), required=False),
+        startup.run("market_stats", matching_service.load_market_stats(), required=False),
+    )
+    
+    # Every worker checkpoints its own share; the file merges them
+    if Config.MARKET_STATS_PATH:
+        market_stats_task = asyncio.create_task(_market_stats_loop())
+    
+    retries = {
+        "supabase_pool": matching_service.startup,
+        "buyer_cache": matching_service.warm_up,
+    }
+    while not startup.is_ready:
+        await asyncio.sleep(5)
+        await asyncio.gather(*[
+            startup.run(name, retry())
+            for name, retry in retries.items()
+            if startup.stages[name].status == "failed"
+        ])
+    
+    print(f"✅ Service ready: {startup.report()['stages']}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    print("🚀 Starting Message Processing Service...")
+    Config.validate()
+    
+    # Serve /livez right away; /readyz flips once the required stages are warm
+    init_task = asyncio.create_task(_initialize())
+    
     yield
     
     # Shutdown
     print("🛑 Shutting down Message Processing Service...")
+    init_task.cancel()
     if telegram_monitor and telegram_monitor.is_running:
         print("🛑 Stopping Telegram monitor...")
         await telegram_monitor.stop()
+    if snapshot_task:
+        snapshot_task.cancel()
+        try:
+            await matching_service.save_snapshot()
+        except Exception as e:
+            print(f"❌ Buyer snapshot on shutdown failed: {e}")
+    if market_stats_task:
+        market_stats_task.cancel()
+        try:
+            await matching_service.checkpoint_market_stats()
+        except Exception as e:
+            print(f"❌ Market stats checkpoint on shutdown failed: {e}")
+    if leader_election:
+        await leader_election.stop()
+    # Unsent digest rows stay unnotified in the matches table for the next leader
+    await matching_service.digests.stop()
+    matching_service.match_executor.close()
+    await matching_service.shutdown()
 
 app = FastAPI(
     title="Message Processing Service",
@@ -49,6 +162,36 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Buyer bot webhook and preferences CRUD, formerly the n8n editing.js node
+app.include_router(messages.router)
+app.include_router(preferences.router)
+
+def _cached_json(entry: CachedResponse, request: Request) -> Response:
+    """Serve a cached body, or 304 when the client already has this ETag"""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if entry.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+@asynccontextmanager
+async def _admitted(priority: str):
+    """Hold an admission slot for the request, or answer 429 with Retry-After"""
+    try:
+        await admission.acquire(priority)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many matching requests: {e.reason}",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        admission.release(time.monotonic() - started)
+
 @app.get("/")
 async def root():
     return {
@@ -62,8 +205,11 @@ async def health():
     """Health check endpoint"""
     try:
         telegram_status = "not_initialized"
+        role = leader_election.role if leader_election else "follower"
         
-        if telegram_monitor:
+        if role == "follower":
+            telegram_status = "follower"
+        elif telegram_monitor:
             # Check if the monitor has the get_status method
             if hasattr(telegram_monitor, 'get_status'):
                 try:
@@ -82,6 +228,9 @@ async def health():
             "status": "healthy", 
             "service": "message-processor",
             "telegram_monitor": telegram_status,
+            "role": role,
+            "ready": startup.is_ready,
+            "matcher": matching_service.match_executor.mode,
             "environment": Config.ENVIRONMENT
         }
     except Exception as e:
@@ -90,9 +239,23 @@ async def health():
             "error": str(e)
         }
 
+@app.get("/livez")
+async def livez():
+    """Liveness probe: the event loop is up and answering"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: 200 only once every required subsystem is warm"""
+    report = startup.report()
+    report["role"] = leader_election.role if leader_election else "follower"
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
 @app.post("/telegram/start")
 async def start_telegram_monitor():
     """Start the Telegram monitor"""
+    if not (leader_election and leader_election.is_leader):
+        return {"status": "follower", "message": "This worker is not the leader"}
     if not telegram_monitor:
         return {"status": "error", "message": "Telegram monitor not initialized"}
     
@@ -119,37 +282,135 @@ async def health_check():
             "message_count": telegram_monitor._message_count,
             "timestamp": time.time()
         }
+    elif not (leader_election and leader_election.is_leader):
+        return {"status": "follower", "message": "Monitor runs on the leader worker"}
+    elif not telegram_monitor:
+        return {"status": "error", "message": "Telegram monitor not initialized"}
     else:
         # Try to restart if not running
         asyncio.create_task(telegram_monitor.start())
         return {"status": "restarting", "message": "Monitor was stopped, restarting..."}
 
+@app.get("/media/{message_id}")
+async def get_message_media(message_id: int):
+    """Stored photos for a seller message and earlier messages reusing them"""
+    # Read from the shared store, so followers answer as well as the leader
+    media = await asyncio.to_thread(load_message_media, Config.MEDIA_DIR, message_id)
+    return {
+        "success": media is not None,
+        "message_id": message_id,
+        "media": media,
+        "pipeline": telegram_monitor.media_pipeline.stats() if telegram_monitor else None
+    }
+
 @app.post("/process-listing")
-async def process_listing(listing_data: dict):
+async def process_listing(listing_data: dict, x_priority: str = Header(LIVE)):
     """Create listing + find matches + return matches"""
-    return await matching_service.process_listing_and_match(listing_data)
+    async with _admitted(x_priority):
+        return await matching_service.process_listing_and_match(listing_data)
     
+@app.post("/update-listing")
+async def update_listing(listing_data: dict, x_priority: str = Header(LIVE)):
+    """Apply an edited seller message to its listing and re-match affected buyers"""
+    async with _admitted(x_priority):
+        return await matching_service.update_listing_and_rematch(listing_data)
+
 @app.post("/debug-insert")
 async def debug_insert():
     """Debug endpoint to test basic insert"""
     return await matching_service.debug_insert()
 
 @app.get("/matches/{listing_id}")
-async def get_matches(listing_id: str):
+async def get_matches(listing_id: str, request: Request):
     """Get EXISTING matches for a listing from the database"""
-    matches = await matching_service.get_existing_matches(listing_id=listing_id)
-    return {"matches": matches}
+    async def fetch():
+        matches = await matching_service._get("matches", {"select": "*", "listing_id": f"eq.{listing_id}"})
+        return {"matches": matches}
+    
+    try:
+        # Other workers' writes are not seen here, so match lists only live briefly
+        entry = await response_cache.get_or_fetch(
+            f"matches:{listing_id}", fetch, tags=[f"matches:{listing_id}"], ttl=Config.RESPONSE_CACHE_MATCHES_TTL
+        )
+        return _cached_json(entry, request)
+    except Exception as e:
+        print(f"❌ Error fetching matches for {listing_id}: {e}")
+        return {"matches": []}
+
+@app.post("/matches/mark-notified")
+async def mark_matches_notified(payload: dict):
+    """Mark matches as notified once n8n has sent them"""
+    try:
+        updated = await matching_service.mark_matches_notified(payload.get("match_ids", []))
+        return {"success": True, "updated": len(updated)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
 @app.get("/unnotified-matches")
 async def get_unnotified_matches():
     """Get all matches that haven't been notified yet"""
-    matches = await matching_service.get_existing_matches(notified=False)
+    # Rows of digest-mode buyers are sent by the leader's digest service, not per match
+    matches = await matching_service.get_instant_matches()
     return {
         "success": True,
         "matches": matches,
         "count": len(matches)
     }
 
+@app.get("/admission/stats")
+async def admission_stats():
+    """Concurrency, queue depth and rejection counters per priority lane"""
+    return admission.stats()
+
+@app.get("/digests/stats")
+async def digest_stats():
+    """Open digests and delivery counters"""
+    return matching_service.digests.stats()
+
+def _stats_query(make: str, model: str = None, year: int = None, quantiles: str = None):
+    try:
+        points = [float(q) for q in quantiles.split(",")] if quantiles else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="quantiles must be comma separated numbers")
+    if points and not all(0 <= q <= 1 for q in points):
+        raise HTTPException(status_code=400, detail="quantiles must be between 0 and 1")
+    
+    kwargs = {"quantiles": points} if points else {}
+    return matching_service.market_stats.query(make, model, year, **kwargs)
+
+@app.get("/stats")
+async def market_stats_overview():
+    """Listing counts per make and checkpoint state of the market statistics"""
+    return {
+        "makes": matching_service.market_stats.makes(),
+        **matching_service.market_stats.stats(),
+    }
+
+@app.get("/stats/{make}")
+async def market_stats_make(make: str, quantiles: str = None):
+    """Price statistics for a make across all its models and years"""
+    result = _stats_query(make, quantiles=quantiles)
+    result["models"] = matching_service.market_stats.models(make)
+    return result
+
+@app.get("/stats/{make}/{model}")
+async def market_stats_model(make: str, model: str, quantiles: str = None):
+    """Price statistics for a make and model across all years"""
+    return _stats_query(make, model, quantiles=quantiles)
+
+@app.get("/stats/{make}/{model}/{year}")
+async def market_stats_year(make: str, model: str, year: int, quantiles: str = None):
+    """Price statistics for one make/model/year bucket"""
+    return _stats_query(make, model, year, quantiles=quantiles)
+
+@app.post("/digests/flush")
+async def flush_digests():
+    """Send every pending digest now"""
+    if not matching_service.digests.is_running:
+        return {"success": False, "error": "Digests are sent by the leader worker"}
+    sent = await matching_service.digests.flush_due(force=True)
+    return {"success": True, "sent_matches": sent, **matching_service.digests.stats()}
+
 @app.get("/test-connection")
 async def test_connection():
     """Test endpoint to verify Supabase connection"""
@@ -171,9 +432,10 @@ async def test_connection():
         }
 
 @app.post("/trigger-matching/{listing_id}")
-async def trigger_matching(listing_id: str):
+async def trigger_matching(listing_id: str, x_priority: str = Header(BACKFILL)):
     """Trigger matching for an existing listing"""
-    matches = await matching_service.find_matches_for_listing(listing_id)
+    async with _admitted(x_priority):
+        matches = await matching_service.find_matches_for_listing(listing_id)
     return {
         "success": True,
         "listing_id": listing_id,
@@ -198,33 +460,37 @@ async def create_test_buyer():
     
     try:
         result = await matching_service._insert("buyers", test_buyer)
+        matching_service.preference_cache.invalidate()
         return {"success": True, "buyer": result[0] if result else None}
     except Exception as e:
         return {"success": False, "error": str(e)}
     
 @app.get("/listings")
-async def get_all_listings():
+async def get_all_listings(request: Request):
     """Get all listings to verify IDs"""
-    try:
+    async def fetch():
         listings = await matching_service._get("listings", {"select": "id,category,product_data", "order": "extracted_at.desc"})
         return {
             "success": True,
             "count": len(listings),
             "listings": listings
         }
+    
+    try:
+        entry = await response_cache.get_or_fetch("listings", fetch, tags=["listings"])
+        return _cached_json(entry, request)
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 @app.get("/test-listing-query/{listing_id}")
-async def test_listing_query(listing_id: str):
+async def test_listing_query(listing_id: str, request: Request):
     """Test direct listing query"""
-    try:
-        # Test the exact same query your matching service uses
-        params = {"id": f"eq.{listing_id}"}
+    # Test the exact same query your matching service uses
+    params = {"id": f"eq.{listing_id}"}
+    
+    async def fetch():
         print(f"🔍 Testing query with params: {params}")
-        
         listings = await matching_service._get("listings", params)
-        
         return {
             "success": True,
             "listing_id": listing_id,
@@ -232,9 +498,20 @@ async def test_listing_query(listing_id: str):
             "listings": listings,
             "query_params": params
         }
+    
+    try:
+        entry = await response_cache.get_or_fetch(
+            f"listing:{listing_id}", fetch, tags=[f"listing:{listing_id}"]
+        )
+        return _cached_json(entry, request)
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache counters for sizing RESPONSE_CACHE_SIZE / RESPONSE_CACHE_TTL"""
+    return response_cache.stats()
+
 @app.post("/test-telegram-webhook")
 async def test_telegram_webhook(payload: dict):
     """Test endpoint that simulates the exact format telegram_monitor sends"""
@@ -0,0 +1,21 @@
+import hmac
+
+from fastapi import Header, HTTPException
+
+from config import Config
+
+
+def _check(expected: str, given: str, name: str):
+    if not expected:
+        raise HTTPException(status_code=503, detail=f"{name} is not configured")
+    if not given or not hmac.compare_digest(given, expected):
+        raise HTTPException(status_code=401, detail=f"Invalid {name}")
+
+
+async def require_bot_secret(x_telegram_bot_api_secret_token: str = Header(None)):
+    """Telegram sends the setWebhook secret_token in this header on every update"""
+    _check(Config.BOT_WEBHOOK_SECRET, x_telegram_bot_api_secret_token, "bot webhook secret")
+
+
+async def require_api_key(x_api_key: str = Header(None)):
+    _check(Config.PREFERENCES_API_KEY, x_api_key, "API key")
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+
+from app.routes.auth import require_bot_secret
+from app.services.buyer_bot import buyer_bot
+from app.utils.helpers import send_telegram_message
+
+router = APIRouter(prefix="/messages", tags=["messages"])
+
+
+@router.post("/telegram", dependencies=[Depends(require_bot_secret)])
+async def telegram_update(update: dict, deliver: bool = True):
+    """Buyer bot webhook: advance the chat's conversation and send the replies.
+
+    With ``deliver=false`` the replies are only returned, for callers that
+    send them themselves.
+    """
+    replies = await buyer_bot.handle(update)
+    if deliver:
+        # Sequential so a chat sees its replies in order
+        for reply in replies:
+            await send_telegram_message(reply["chat_id"], reply["message"], keyboard=reply["keyboard"])
+    return {"replies": replies}
+
+
+@router.get("/sessions/stats")
+async def session_stats():
+    """Open bot conversations and how many have expired"""
+    return buyer_bot.sessions.stats()
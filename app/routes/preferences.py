@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.routes.auth import require_api_key
+from app.services.preferences_service import preferences_service
+
+router = APIRouter(prefix="/preferences", tags=["preferences"], dependencies=[Depends(require_api_key)])
+
+
+@router.get("/{chat_id}")
+async def get_preferences(chat_id: int):
+    """The buyer registered from this Telegram chat"""
+    buyer = await preferences_service.get_buyer(chat_id)
+    if buyer is None:
+        raise HTTPException(status_code=404, detail="Buyer not found")
+    return {"buyer": buyer}
+
+
+@router.put("/{chat_id}")
+async def put_preferences(chat_id: int, payload: dict):
+    """Create or replace a buyer's search: {"name", "cell_number", "preferences": {...}}"""
+    try:
+        buyer = await preferences_service.replace_preferences(
+            chat_id,
+            payload.get("preferences") or {},
+            name=payload.get("name"),
+            cell_number=payload.get("cell_number"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "buyer": buyer}
+
+
+@router.patch("/{chat_id}")
+async def patch_preferences(chat_id: int, changes: dict):
+    """Change some preferences; a null value removes that filter"""
+    try:
+        buyer = await preferences_service.update_preferences(chat_id, changes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if buyer is None:
+        raise HTTPException(status_code=404, detail="Buyer not found")
+    return {"success": True, "buyer": buyer}
+
+
+@router.delete("/{chat_id}")
+async def unsubscribe(chat_id: int):
+    """Stop matches for the buyer; preferences are kept for a later /register"""
+    buyer = await preferences_service.unsubscribe(chat_id)
+    if buyer is None:
+        raise HTTPException(status_code=404, detail="Buyer not found")
+    return {"success": True, "buyer": buyer}
@@ -0,0 +1,141 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+LIVE = "live"
+BACKFILL = "backfill"
+LANES = (LIVE, BACKFILL)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; ``retry_after`` is in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _LaneStats:
+    __slots__ = ("admitted", "rejected_full", "rejected_deadline", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class AdmissionController:
+    """Caps concurrent matching work and queues the overflow by priority.
+
+    At most ``limit`` requests run at once. Others wait in a bounded FIFO per
+    lane; a freed slot always goes to the ``live`` lane first so real-time
+    seller messages are not stuck behind a backfill. A request is rejected
+    when its lane's queue is full or when it has waited ``deadline`` seconds.
+    """
+
+    def __init__(self, limit: int = 8, queue_sizes: Dict[str, int] = None, deadline: float = 10.0):
+        self.limit = limit
+        self.queue_sizes = queue_sizes or {LIVE: 100, BACKFILL: 50}
+        self.deadline = deadline
+        self.active = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self._stats = {lane: _LaneStats() for lane in LANES}
+        # Exponential moving average of time spent holding a slot
+        self._service_time = 0.5
+
+    def _retry_after(self) -> int:
+        queued = sum(len(q) for q in self._queues.values())
+        return max(1, math.ceil(self._service_time * (queued + 1) / max(self.limit, 1)))
+
+    def _pass_slot(self):
+        """Hand a finished request's slot to the next waiter, live lane first"""
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+
+    async def acquire(self, lane: str = LIVE) -> float:
+        """Wait for a slot, returns the time spent queued"""
+        lane = lane if lane in self._queues else LIVE
+        stats = self._stats[lane]
+
+        if self.active < self.limit and not any(self._queues.values()):
+            self.active += 1
+            stats.admitted += 1
+            return 0.0
+
+        queue = self._queues[lane]
+        if len(queue) >= self.queue_sizes.get(lane, 0):
+            stats.rejected_full += 1
+            raise AdmissionRejected(f"{lane} queue is full", self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Granted a slot in the same tick the deadline fired; hand it on
+                self._pass_slot()
+            else:
+                waiter.cancel()
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+            stats.rejected_deadline += 1
+            raise AdmissionRejected(f"waited more than {self.deadline}s in {lane} queue", self._retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._pass_slot()
+            else:
+                waiter.cancel()
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+        # The slot is transferred directly from the releasing request, so active is unchanged
+        waited = time.monotonic() - started
+        stats.admitted += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        return waited
+
+    def release(self, held_for: float):
+        """Give back a slot held for ``held_for`` seconds"""
+        self._service_time = 0.8 * self._service_time + 0.2 * held_for
+        self._pass_slot()
+
+    def stats(self) -> Dict[str, Any]:
+        lanes = {}
+        for lane in LANES:
+            stats = self._stats[lane]
+            waited = max(stats.admitted, 1)
+            lanes[lane] = {
+                "queued": len(self._queues[lane]),
+                "queue_size": self.queue_sizes.get(lane, 0),
+                "admitted": stats.admitted,
+                "rejected_full": stats.rejected_full,
+                "rejected_deadline": stats.rejected_deadline,
+                "avg_wait_ms": round(stats.wait_total / waited * 1000, 1),
+                "max_wait_ms": round(stats.wait_max * 1000, 1),
+            }
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "deadline_s": self.deadline,
+            "avg_service_ms": round(self._service_time * 1000, 1),
+            "lanes": lanes,
+        }
@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class BotSession:
+    """Conversation state for one chat: the step it is on and what it has collected"""
+
+    __slots__ = ("chat_id", "step", "data", "touched_at")
+
+    def __init__(self, chat_id: int, step: str = "menu"):
+        self.chat_id = chat_id
+        self.step = step
+        self.data: Dict[str, Any] = {}
+        self.touched_at = time.monotonic()
+
+
+class SessionStore:
+    """In-memory bot sessions that expire ``ttl`` seconds after their last message.
+
+    Expired sessions are dropped when looked up and by ``evict_expired``; the
+    store also stays under ``max_sessions`` by evicting the least recently
+    used chat. Losing a session only restarts that chat's conversation at the
+    menu, since everything already confirmed is stored in the buyers table.
+    """
+
+    def __init__(self, ttl: float = 1800.0, max_sessions: int = 10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[int, BotSession]" = OrderedDict()
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, chat_id: int) -> Optional[BotSession]:
+        session = self._sessions.get(chat_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.touched_at > self.ttl:
+            del self._sessions[chat_id]
+            self.expired += 1
+            return None
+        return session
+
+    def get_or_create(self, chat_id: int) -> BotSession:
+        session = self.get(chat_id)
+        if session is None:
+            session = BotSession(chat_id)
+            self._sessions[chat_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        session.touched_at = time.monotonic()
+        self._sessions.move_to_end(chat_id)
+        return session
+
+    def end(self, chat_id: int):
+        self._sessions.pop(chat_id, None)
+
+    def evict_expired(self) -> int:
+        """Drop every expired session; sessions are ordered by last use so this stops early"""
+        cutoff = time.monotonic() - self.ttl
+        evicted = 0
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if session.touched_at >= cutoff:
+                break
+            del self._sessions[chat_id]
+            evicted += 1
+        self.expired += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl,
+            "expired": self.expired,
+        }
@@ -0,0 +1,408 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from app.services.bot_sessions import BotSession, SessionStore
+from app.services.preference_cache import is_houses
+from app.services.preferences_service import PreferencesService, normalize_preferences, preferences_service
+
+# Descriptions shown in the menu, as in the old n8n node
+COMMANDS = {
+    "/register": "🚗 Set up your product preferences to get automatic matches",
+    "/edit": "✏️ Update your product preferences or contact information",
+    "/unsubscribe": "🔕 Stop receiving product match notifications",
+    "/help": "❓ Get help on how to use this service",
+}
+
+MENU_KEYBOARD = {
+    "keyboard": [["/register", "/edit"], ["/unsubscribe", "/help"]],
+    "resize_keyboard": True,
+    "one_time_keyboard": False,
+}
+CONTACT_KEYBOARD = {
+    "keyboard": [[{"text": "📱 Share Phone Number", "request_contact": True}]],
+    "resize_keyboard": True,
+    "one_time_keyboard": True,
+}
+PRODUCT_TYPE_KEYBOARD = {
+    "keyboard": [["🚗 Vehicles", "🏠 Houses & Stands"]],
+    "resize_keyboard": True,
+    "one_time_keyboard": True,
+}
+ANY_KEYBOARD = {"keyboard": [["Any"]], "resize_keyboard": True, "one_time_keyboard": True}
+NOTIFICATION_KEYBOARD = {
+    "keyboard": [["⚡ Instant", "📬 Digest"]],
+    "resize_keyboard": True,
+    "one_time_keyboard": True,
+}
+CONFIRM_KEYBOARD = {"keyboard": [["Yes, unsubscribe", "No"]], "resize_keyboard": True, "one_time_keyboard": True}
+
+# Edit menu buttons and the step each one opens
+EDIT_FIELDS = {
+    "Makes": "awaiting_make",
+    "Models": "awaiting_model",
+    "Price range": "awaiting_price",
+    "Min year": "awaiting_year",
+    "Notifications": "awaiting_notifications",
+    "Phone number": "awaiting_contact",
+}
+EDIT_DONE = "✅ Done"
+EDIT_KEYBOARD = {
+    "keyboard": [["Makes", "Models"], ["Price range", "Min year"], ["Notifications", "Phone number"], [EDIT_DONE]],
+    "resize_keyboard": True,
+    "one_time_keyboard": False,
+}
+
+# Registration asks these in order; houses skip the vehicle-only questions
+REGISTRATION_STEPS = {
+    "vehicles": ["awaiting_make", "awaiting_model", "awaiting_price", "awaiting_year", "awaiting_notifications"],
+    "houses": ["awaiting_price", "awaiting_notifications"],
+}
+
+PROMPTS = {
+    "awaiting_make": ("🚘 Which makes are you looking for? Send one or more separated by commas "
+                      "(e.g. Toyota, Honda), or Any.", ANY_KEYBOARD),
+    "awaiting_model": ("📋 Which models? Send them separated by commas (e.g. Camry, Accord), or Any.", ANY_KEYBOARD),
+    "awaiting_price": ("💰 What is your price range? For example 10000-20000, 10k-20k, under 15000, "
+                       "from 8000, or Any.", ANY_KEYBOARD),
+    "awaiting_year": ("📅 What is the oldest year you would accept? For example 2015, or Any.", ANY_KEYBOARD),
+    "awaiting_notifications": ("🔔 How should we notify you? ⚡ Instant sends each match right away, "
+                               "📬 Digest groups them into one message.", NOTIFICATION_KEYBOARD),
+    "awaiting_contact": ("📱 Please share your phone number with the button below:", CONTACT_KEYBOARD),
+}
+
+ANY_WORDS = ("any", "skip", "none", "all")
+_MULTIPLIERS = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_price_range(text: str) -> Tuple[Optional[float], Optional[float]]:
+    """Parse "10000-20000", "10k to 20k", "under 15k", "from 8000", "5000+" or "any" into (min, max)"""
+    cleaned = text.lower().replace(",", "").replace(" ", "")
+    if cleaned in ANY_WORDS:
+        return None, None
+
+    values = [
+        float(number) * _MULTIPLIERS.get(suffix, 1)
+        for number, suffix in re.findall(r"(\d+(?:\.\d+)?)([km]?)", cleaned)
+    ]
+    if len(values) == 2:
+        low, high = sorted(values)
+        return low, high
+    if len(values) == 1:
+        if cleaned.startswith(("under", "upto", "max", "below", "<")):
+            return None, values[0]
+        if cleaned.startswith(("from", "over", "min", "above", ">")) or cleaned.endswith("+"):
+            return values[0], None
+    raise ValueError("Please send a range like 10000-20000, under 15000, from 8000, or Any.")
+
+
+def _names(text: str) -> Optional[List[str]]:
+    if text.lower() in ANY_WORDS:
+        return None
+    names = [part.strip().lower() for part in text.split(",") if part.strip()]
+    if not names:
+        raise ValueError("Please send at least one name, or Any.")
+    return names
+
+
+def _price(value: Any) -> Optional[float]:
+    # Rows written by n8n may hold prices as strings
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def describe_preferences(buyer: Dict[str, Any]) -> str:
+    """Human readable summary of a buyer's search"""
+    preferences = buyer.get("preferences") or {}
+    lines = [f"• Name: {buyer.get('name', '')}", f"• Phone: {buyer.get('cell_number', '')}"]
+    houses = is_houses(preferences.get("product_type"))
+    if houses:
+        lines.append("• Looking for: Houses & Stands")
+    else:
+        lines.append(f"• Makes: {', '.join(preferences.get('make') or []) or 'Any'}")
+        lines.append(f"• Models: {', '.join(preferences.get('model') or []) or 'Any'}")
+
+    min_price, max_price = _price(preferences.get("min_price")), _price(preferences.get("max_price"))
+    if min_price is None and max_price is None:
+        price = "Any"
+    elif max_price is None:
+        price = f"from {min_price:,.0f}"
+    elif min_price is None:
+        price = f"up to {max_price:,.0f}"
+    else:
+        price = f"{min_price:,.0f} - {max_price:,.0f}"
+    lines.append(f"• Price: {price}")
+    if not houses:
+        lines.append(f"• Oldest year: {preferences.get('min_year') or 'Any'}")
+    lines.append(f"• Notifications: {preferences.get('notification_mode', Config.NOTIFY_MODE_DEFAULT)}")
+    if preferences.get("unsubscribed"):
+        lines.append("• 🔕 Unsubscribed")
+    return "\n".join(lines)
+
+
+class BuyerBot:
+    """Conversation state machine for the buyer bot, replacing the n8n editing.js node.
+
+    ``handle`` takes a Telegram update and returns the replies to send as
+    ``{"chat_id", "message", "keyboard"}`` dicts. The step a chat is on lives
+    in the in-memory session store; confirmed answers are written through
+    ``PreferencesService`` so they reach the matcher immediately. Commands
+    always win over the current step, so /register or /help never get stuck.
+    Sessions are per process, so with several uvicorn workers the bot webhook
+    should be served by a single one (or sticky by chat id).
+    """
+
+    def __init__(self, preferences: PreferencesService, sessions: SessionStore):
+        self.preferences = preferences
+        self.sessions = sessions
+
+    @staticmethod
+    def _reply(chat_id: int, message: str, keyboard: Dict[str, Any] = None) -> Dict[str, Any]:
+        return {"chat_id": chat_id, "message": message, "keyboard": keyboard}
+
+    async def handle(self, update: Dict[str, Any]) -> List[Dict[str, Any]]:
+        message = update.get("message") or {}
+        chat_id = (message.get("chat") or {}).get("id")
+        if chat_id is None:
+            return []
+
+        self.sessions.evict_expired()
+        sender = message.get("from") or {}
+        first_name = sender.get("first_name") or ""
+        text = (message.get("text") or "").strip()
+        contact = message.get("contact")
+        session = self.sessions.get_or_create(chat_id)
+
+        command = text.split("@")[0].lower() if text.startswith("/") else None
+        try:
+            if command == "/register":
+                return [self._start_registration(session, first_name)]
+            if command == "/edit":
+                return [await self._start_edit(session)]
+            if command == "/unsubscribe":
+                return [await self._start_unsubscribe(session)]
+            if command == "/cancel":
+                self.sessions.end(chat_id)
+                return [self._reply(chat_id, "👌 Cancelled.", MENU_KEYBOARD)]
+            if command == "/help":
+                return [self._help(session)]
+            if contact:
+                return [await self._on_contact(session, contact, sender)]
+
+            handler = getattr(self, f"_on_{session.step}", None)
+            if handler is None or not text:
+                return [self._menu(session, first_name)]
+            return [await handler(session, text)]
+
+        except ValueError as e:
+            # Bad input keeps the chat on the same step so the user can try again
+            prompt = PROMPTS.get(session.step)
+            return [self._reply(chat_id, f"⚠️ {e}", prompt[1] if prompt else None)]
+        except Exception as e:
+            print(f"❌ Bot error for chat {chat_id}: {e}")
+            return [self._reply(chat_id, "❌ Something went wrong, please try again in a moment.")]
+
+    def _menu(self, session: BotSession, first_name: str) -> Dict[str, Any]:
+        session.step = "menu"
+        command_list = "\n".join(f"{command} - {description}" for command, description in COMMANDS.items())
+        return self._reply(
+            session.chat_id,
+            f"👋 Hello {first_name}! I'm your product matching assistant.\n\n{command_list}\n\n"
+            f"Please click a command above to get started.",
+            MENU_KEYBOARD,
+        )
+
+    def _help(self, session: BotSession) -> Dict[str, Any]:
+        session.step = "menu"
+        return self._reply(
+            session.chat_id,
+            "❓ How to use this service:\n\n"
+            "• Use /register to set up your product preferences\n"
+            "• You'll get automatic notifications when matching products are listed\n"
+            "• Use /edit to update your preferences anytime\n"
+            "• Use /unsubscribe to stop notifications\n"
+            "• Use /cancel to leave a question unanswered",
+            MENU_KEYBOARD,
+        )
+
+    # Registration
+
+    def _start_registration(self, session: BotSession, first_name: str) -> Dict[str, Any]:
+        session.step = "awaiting_name"
+        session.data = {"first_name": first_name}
+        return self._reply(
+            session.chat_id,
+            f"👋 Welcome {first_name}! Let's get you registered for product matches.\n\n"
+            f"First, what's your full name?",
+            {"remove_keyboard": True},
+        )
+
+    async def _on_awaiting_name(self, session: BotSession, text: str) -> Dict[str, Any]:
+        if len(text) < 2 or text.startswith("/"):
+            raise ValueError("Please send your full name.")
+        session.data["full_name"] = text
+        session.step = "awaiting_contact"
+        return self._reply(session.chat_id, f"✅ Thanks, {text}! Now please share your phone number:", CONTACT_KEYBOARD)
+
+    async def _on_awaiting_contact(self, session: BotSession, text: str) -> Dict[str, Any]:
+        raise ValueError("Please use the 📱 Share Phone Number button so we can verify your number.")
+
+    async def _on_contact(self, session: BotSession, contact: Dict[str, Any], sender: Dict[str, Any]) -> Dict[str, Any]:
+        # Any contact card can be forwarded; only the sender's own one proves the number
+        if contact.get("user_id") is None or contact.get("user_id") != sender.get("id"):
+            raise ValueError("Please share your own phone number with the 📱 Share Phone Number button.")
+        phone = contact.get("phone_number")
+        if session.data.get("editing"):
+            buyer = await self.preferences.save_buyer(session.chat_id, cell_number=phone)
+            return self._edit_menu(session, f"✅ Phone number updated.\n\n{describe_preferences(buyer)}")
+
+        # A contact shared outside /register starts a registration, as the n8n node did
+        contact_name = f"{contact.get('first_name') or ''} {contact.get('last_name') or ''}".strip()
+        name = session.data.get("full_name") or contact_name or sender.get("first_name") or ""
+        session.data.update({"full_name": name, "phone": phone})
+        session.step = "awaiting_product_type"
+        return self._reply(
+            session.chat_id,
+            f"✅ Perfect! Phone number verified.\n\n• Name: {name}\n• Phone: {phone}\n\n"
+            f"Now let's set up your product preferences...",
+            PRODUCT_TYPE_KEYBOARD,
+        )
+
+    async def _on_awaiting_product_type(self, session: BotSession, text: str) -> Dict[str, Any]:
+        lowered = text.lower()
+        if "vehicle" in lowered:
+            product_type = "vehicles"
+        elif "house" in lowered or "stand" in lowered:
+            product_type = "houses"
+        else:
+            return self._reply(session.chat_id, "Please pick one of the options below.", PRODUCT_TYPE_KEYBOARD)
+        session.data["preferences"] = {"product_type": product_type}
+        return self._ask(session, REGISTRATION_STEPS[product_type][0])
+
+    def _ask(self, session: BotSession, step: str) -> Dict[str, Any]:
+        session.step = step
+        message, keyboard = PROMPTS[step]
+        return self._reply(session.chat_id, message, keyboard)
+
+    async def _answered(self, session: BotSession, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Store one answer: saved at once while editing, collected until the end while registering"""
+        changes = normalize_preferences(changes)
+        if session.data.get("editing"):
+            buyer = await self.preferences.update_preferences(session.chat_id, changes)
+            if buyer is None:
+                self.sessions.end(session.chat_id)
+                return self._reply(session.chat_id, "You're not registered yet, use /register first.", MENU_KEYBOARD)
+            return self._edit_menu(session, f"✅ Updated.\n\n{describe_preferences(buyer)}")
+
+        preferences = session.data.setdefault("preferences", {"product_type": "vehicles"})
+        preferences.update(changes)
+        steps = REGISTRATION_STEPS[preferences.get("product_type", "vehicles")]
+        position = steps.index(session.step) if session.step in steps else len(steps) - 1
+        if session.step == "awaiting_make" and changes.get("make") is None:
+            # Models only make sense for a chosen make
+            position += 1
+        if position + 1 < len(steps):
+            return self._ask(session, steps[position + 1])
+        return await self._finish_registration(session)
+
+    async def _finish_registration(self, session: BotSession) -> Dict[str, Any]:
+        # Re-registering also lifts an earlier /unsubscribe
+        preferences = {**session.data.get("preferences", {}), "unsubscribed": None}
+        buyer = await self.preferences.save_buyer(
+            session.chat_id,
+            name=session.data.get("full_name") or session.data.get("first_name"),
+            cell_number=session.data.get("phone"),
+            preferences=preferences,
+        )
+        self.sessions.end(session.chat_id)
+        return self._reply(
+            session.chat_id,
+            f"🎉 You're all set! We'll notify you about matching listings.\n\n{describe_preferences(buyer)}\n\n"
+            f"Use /edit anytime to change this.",
+            MENU_KEYBOARD,
+        )
+
+    async def _on_awaiting_make(self, session: BotSession, text: str) -> Dict[str, Any]:
+        makes = _names(text)
+        changes = {"make": makes}
+        if makes is None:
+            changes["model"] = None
+        return await self._answered(session, changes)
+
+    async def _on_awaiting_model(self, session: BotSession, text: str) -> Dict[str, Any]:
+        return await self._answered(session, {"model": _names(text)})
+
+    async def _on_awaiting_price(self, session: BotSession, text: str) -> Dict[str, Any]:
+        min_price, max_price = parse_price_range(text)
+        return await self._answered(session, {"min_price": min_price, "max_price": max_price})
+
+    async def _on_awaiting_year(self, session: BotSession, text: str) -> Dict[str, Any]:
+        if text.lower() in ANY_WORDS:
+            return await self._answered(session, {"min_year": None})
+        if not text.isdigit():
+            raise ValueError("Please send a year like 2015, or Any.")
+        return await self._answered(session, {"min_year": int(text)})
+
+    async def _on_awaiting_notifications(self, session: BotSession, text: str) -> Dict[str, Any]:
+        lowered = text.lower()
+        if "instant" in lowered:
+            mode = "instant"
+        elif "digest" in lowered:
+            mode = "digest"
+        else:
+            raise ValueError("Please pick ⚡ Instant or 📬 Digest.")
+        return await self._answered(session, {"notification_mode": mode})
+
+    # Editing
+
+    async def _start_edit(self, session: BotSession) -> Dict[str, Any]:
+        buyer = await self.preferences.get_buyer(session.chat_id)
+        if buyer is None:
+            self.sessions.end(session.chat_id)
+            return self._reply(session.chat_id, "You're not registered yet, use /register first.", MENU_KEYBOARD)
+        session.data = {"editing": True}
+        return self._edit_menu(session, f"✏️ Your current preferences:\n\n{describe_preferences(buyer)}")
+
+    def _edit_menu(self, session: BotSession, message: str) -> Dict[str, Any]:
+        session.step = "edit_menu"
+        return self._reply(session.chat_id, f"{message}\n\nWhat would you like to change?", EDIT_KEYBOARD)
+
+    async def _on_edit_menu(self, session: BotSession, text: str) -> Dict[str, Any]:
+        if text == EDIT_DONE:
+            self.sessions.end(session.chat_id)
+            return self._reply(session.chat_id, "👍 Preferences saved.", MENU_KEYBOARD)
+        step = EDIT_FIELDS.get(text)
+        if step is None:
+            return self._edit_menu(session, "Please pick one of the options below.")
+        return self._ask(session, step)
+
+    # Unsubscribe
+
+    async def _start_unsubscribe(self, session: BotSession) -> Dict[str, Any]:
+        buyer = await self.preferences.get_buyer(session.chat_id)
+        if buyer is None or (buyer.get("preferences") or {}).get("unsubscribed"):
+            self.sessions.end(session.chat_id)
+            return self._reply(session.chat_id, "🔕 You're not receiving notifications.", MENU_KEYBOARD)
+        session.step = "confirm_unsubscribe"
+        session.data = {}
+        return self._reply(session.chat_id, "🔕 Stop receiving product match notifications?", CONFIRM_KEYBOARD)
+
+    async def _on_confirm_unsubscribe(self, session: BotSession, text: str) -> Dict[str, Any]:
+        self.sessions.end(session.chat_id)
+        if not text.lower().startswith("yes"):
+            return self._reply(session.chat_id, "👍 You're still subscribed.", MENU_KEYBOARD)
+        await self.preferences.unsubscribe(session.chat_id)
+        return self._reply(
+            session.chat_id,
+            "🔕 You're unsubscribed and won't get new matches. Use /register to start again.",
+            MENU_KEYBOARD,
+        )
+
+
+# Create singleton instance
+buyer_bot = BuyerBot(
+    preferences_service,
+    SessionStore(ttl=Config.BOT_SESSION_TTL, max_sessions=Config.BOT_SESSION_MAX),
+)
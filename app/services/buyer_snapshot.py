@@ -0,0 +1,190 @@
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Any, Dict, List, Tuple
+
+from app.services.preference_cache import CompiledBuyers
+
+MAGIC = b"PMBUYERS"
+VERSION = 1
+# magic, format version, length of the JSON metadata block
+HEADER = struct.Struct("<8sIQ")
+ALIGN = 8
+
+COLUMN_NAMES = (
+    "min_price", "max_price", "min_year",
+    "make_offsets", "make_codes", "model_offsets", "model_codes",
+)
+
+
+def _pad(size: int) -> int:
+    return -size % ALIGN
+
+
+class LazyBuyers:
+    """Buyer rows backed by JSON slices of the snapshot, decoded on access.
+
+    Only matched candidates are ever decoded, so loading a snapshot does not
+    pay for parsing every buyer. Rows added after loading live in a plain list.
+    """
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self._blob = blob
+        self._offsets = offsets
+        self._base = len(offsets) - 1
+        self._extra: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return self._base + len(self._extra)
+
+    def raw(self, row: int) -> bytes:
+        if row < self._base:
+            return bytes(self._blob[self._offsets[row]:self._offsets[row + 1]])
+        return json.dumps(self._extra[row - self._base], default=str).encode()
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        if row < 0:
+            row += len(self)
+        if row < self._base:
+            return json.loads(self.raw(row))
+        return self._extra[row - self._base]
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def append(self, buyer: Dict[str, Any]):
+        self._extra.append(buyer)
+
+
+class SnapshotBuyers(CompiledBuyers):
+    """CompiledBuyers whose columns are zero-copy views over a memory-mapped file.
+
+    The views are read-only, so the first upsert or tombstone copies the
+    columns into regular arrays; until then matching reads straight from the
+    page cache.
+    """
+
+    def __init__(self, generation: int, watermark_column: str, mm: mmap.mmap):
+        super().__init__(generation, watermark_column)
+        self._mmap = mm
+        self._mutable = False
+        self.written_at = 0.0
+
+    def _ensure_mutable(self):
+        if self._mutable:
+            return
+        for name in COLUMN_NAMES:
+            view = getattr(self, name)
+            column = array(view.format)
+            column.frombytes(view.cast("B"))
+            setattr(self, name, column)
+        self._mutable = True
+
+
+def _raw_row(compiled: CompiledBuyers, row: int) -> bytes:
+    if isinstance(compiled.buyers, LazyBuyers):
+        return compiled.buyers.raw(row)
+    return json.dumps(compiled.buyers[row], default=str).encode()
+
+
+def capture(compiled: CompiledBuyers) -> Tuple[Dict[str, Any], Dict[str, Tuple[bytes, str]], int]:
+    """Copy what a snapshot needs; cheap enough to run on the event loop.
+
+    Columns are copied as bytes and only the row count is recorded, so the
+    slow part (serializing buyers in ``write_snapshot``) can run in a thread
+    while the loop keeps appending rows.
+    """
+    rows = len(compiled)
+    columns = {name: (getattr(compiled, name).tobytes(), _typecode(getattr(compiled, name)))
+               for name in COLUMN_NAMES}
+    ids: List[Any] = [None] * rows
+    for buyer_id, row in compiled.row_by_id.items():
+        if row < rows:
+            ids[row] = buyer_id
+    meta = {
+        "generation": compiled.generation,
+        "watermark": compiled.watermark,
+        "watermark_column": compiled.watermark_column,
+        "vocab": dict(compiled.vocab),
+        "ids": ids,
+        "rows": rows,
+    }
+    return meta, columns, rows
+
+
+def _typecode(column) -> str:
+    return getattr(column, "typecode", None) or column.format
+
+
+def write_snapshot(compiled: CompiledBuyers, captured, path: str) -> int:
+    """Write a captured index to ``path`` atomically; returns the file size"""
+    meta, columns, rows = captured
+
+    blob = bytearray()
+    buyer_offsets = array("q", [0])
+    for row in range(rows):
+        blob += _raw_row(compiled, row)
+        buyer_offsets.append(len(blob))
+
+    sections = [(name, data, typecode) for name, (data, typecode) in columns.items()]
+    sections.append(("buyer_offsets", buyer_offsets.tobytes(), "q"))
+    sections.append(("buyer_blob", bytes(blob), "B"))
+
+    # Section offsets are relative to the aligned end of the metadata, so the
+    # metadata can record them before its own length is known.
+    meta["written_at"] = time.time()
+    relative, cursor = {}, 0
+    for name, data, typecode in sections:
+        relative[name] = (typecode, len(data) // array(typecode).itemsize, cursor)
+        cursor += len(data) + _pad(len(data))
+    meta["sections"] = relative
+    meta_bytes = json.dumps(meta, default=str).encode()
+    data_start = HEADER.size + len(meta_bytes) + _pad(HEADER.size + len(meta_bytes))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(b"\0" * _pad(HEADER.size + len(meta_bytes)))
+        for name, data, typecode in sections:
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return data_start + cursor
+
+
+def load_snapshot(path: str) -> SnapshotBuyers:
+    """Map a snapshot file; raises ValueError if it is from another format version"""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, meta_len = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION:
+        mm.close()
+        raise ValueError(f"Unsupported buyer snapshot {magic!r} v{version}")
+
+    meta = json.loads(mm[HEADER.size:HEADER.size + meta_len])
+    data_start = HEADER.size + meta_len + _pad(HEADER.size + meta_len)
+    view = memoryview(mm)
+
+    def section(name: str) -> memoryview:
+        typecode, count, offset = meta["sections"][name]
+        start = data_start + offset
+        size = count * array(typecode).itemsize
+        return view[start:start + size].cast(typecode)
+
+    compiled = SnapshotBuyers(meta["generation"], meta["watermark_column"], mm)
+    compiled.watermark = meta["watermark"]
+    compiled.written_at = meta["written_at"]
+    compiled.vocab = meta["vocab"]
+    for name in COLUMN_NAMES:
+        setattr(compiled, name, section(name))
+    compiled.buyers = LazyBuyers(section("buyer_blob"), section("buyer_offsets"))
+    compiled.row_by_id = {buyer_id: row for row, buyer_id in enumerate(meta["ids"]) if buyer_id is not None}
+    return compiled
@@ -17,10 +17,6 @@ class DatabaseService:
             self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
             print("✅ DatabaseService initialized with environment variables")
             
-            # Test connection
-            test_response = self.supabase.table("raw_messages").select("count", count="exact").limit(1).execute()
-            print(f"✅ Supabase connection test successful")
-            
         except Exception as e:
             print(f"❌ DatabaseService initialization error: {e}")
             self.supabase = None
@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.utils.helpers import format_listing_line, send_telegram_message
+
+INSTANT = "instant"
+DIGEST = "digest"
+
+
+def _matched_at(row: Dict[str, Any]) -> datetime:
+    try:
+        return datetime.fromisoformat(str(row.get("matched_at")).replace("Z", "").split("+")[0])
+    except ValueError:
+        # Unknown age: send it with the next digest rather than hold it forever
+        return datetime.min
+
+
+class DigestService:
+    """Sends the unnotified matches of digest-mode buyers as one message.
+
+    The ``matches`` table is the only state: match rows are inserted with
+    ``notified = false`` and ``/unnotified-matches`` leaves out rows of
+    digest-mode buyers, so those are only ever sent from here. Only the
+    elected leader runs the loop, which polls ``fetch_pending`` for
+    ``(buyer, row)`` pairs and sends a buyer's digest once its oldest row is
+    ``window`` seconds old or it has ``max_items`` rows. Sent rows are marked
+    notified with one bulk update, so a restart or a new leader simply picks
+    up whatever is still unnotified.
+    """
+
+    def __init__(
+        self,
+        fetch_pending: Callable[[], Awaitable[List[Tuple[Dict[str, Any], Dict[str, Any]]]]],
+        mark_notified: Callable[[List[Any]], Awaitable[Any]],
+        window: float = 900.0,
+        max_items: int = 10,
+        default_mode: str = INSTANT,
+    ):
+        self.fetch_pending = fetch_pending
+        self.mark_notified = mark_notified
+        self.window = window
+        self.max_items = max_items
+        self.default_mode = default_mode
+        self.poll_interval = min(window / 4, 30)
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.pending_matches = 0
+        self.sent_digests = 0
+        self.sent_matches = 0
+
+    def mode_for(self, buyer: Optional[Dict[str, Any]]) -> str:
+        """Delivery mode of a buyer; buyers without a chat to send to stay instant"""
+        if not buyer or buyer.get("chat_id") is None:
+            return INSTANT
+        preferences = buyer.get("preferences") or {}
+        mode = preferences.get("notification_mode") or self.default_mode
+        return DIGEST if mode == DIGEST else INSTANT
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.is_running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.flush_due()
+            except Exception as e:
+                print(f"❌ Digest flush failed: {e}")
+
+    async def flush_due(self, force: bool = False) -> int:
+        """Send every digest that is due (or all of them with ``force``); returns matches sent"""
+        async with self._lock:
+            pending = await self.fetch_pending()
+            self.pending_matches = len(pending)
+
+            by_buyer: Dict[Any, Tuple[Dict[str, Any], List[Dict[str, Any]]]] = {}
+            for buyer, row in pending:
+                by_buyer.setdefault(buyer["id"], (buyer, []))[1].append(row)
+
+            cutoff = datetime.utcnow() - timedelta(seconds=self.window)
+            sent = 0
+            for buyer, rows in by_buyer.values():
+                rows.sort(key=_matched_at)
+                if not force and len(rows) < self.max_items and _matched_at(rows[0]) > cutoff:
+                    continue
+                for start in range(0, len(rows), self.max_items):
+                    sent += await self._send(buyer, rows[start:start + self.max_items])
+            return sent
+
+    async def _send(self, buyer: Dict[str, Any], rows: List[Dict[str, Any]]) -> int:
+        lines = [f"🚗 {len(rows)} new matches for you:"]
+        for row in rows:
+            line = f"• {format_listing_line(row.get('product_data') or {})}"
+            if row.get("seller_contact"):
+                line += f" ({row['seller_contact']})"
+            lines.append(line)
+
+        if not await send_telegram_message(buyer["chat_id"], "\n".join(lines)):
+            # The rows stay unnotified and are retried on the next poll
+            print(f"⚠️ Digest for buyer {buyer['id']} not delivered, retrying later")
+            return 0
+
+        match_ids = [row.get("id") for row in rows]
+        try:
+            await self.mark_notified(match_ids)
+        except Exception as e:
+            print(f"❌ Digest sent but marking {len(match_ids)} matches notified failed: {e}")
+
+        self.sent_digests += 1
+        self.sent_matches += len(match_ids)
+        print(f"📬 Sent digest of {len(match_ids)} matches to buyer {buyer['id']}")
+        return len(match_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.is_running,
+            "window_s": self.window,
+            "max_items": self.max_items,
+            "pending_matches": self.pending_matches,
+            "sent_digests": self.sent_digests,
+            "sent_matches": self.sent_matches,
+        }
@@ -0,0 +1,219 @@
+import asyncio
+import fcntl
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from config import Config
+
+
+class LeaderElection:
+    """Elects a single process to run the Telegram monitor.
+
+    Every uvicorn worker creates one of these. The primary lock is an
+    exclusive ``flock`` on a local file: the kernel drops it the moment the
+    holding process exits, so a follower polling the same file takes over
+    without any timeout. When ``use_db_lease`` is enabled the leader must also
+    hold a row lease in Supabase, which extends the guarantee across hosts.
+    The lease is taken through an RPC so the check-and-set is atomic::
+
+        create table leader_leases (
+            name text primary key,
+            holder text not null,
+            expires_at timestamptz not null
+        );
+
+        create function acquire_leader_lease(lease_name text, lease_holder text, ttl_seconds int)
+        returns boolean language plpgsql as $$
+        begin
+            insert into leader_leases (name, holder, expires_at)
+            values (lease_name, lease_holder, now() + make_interval(secs => ttl_seconds))
+            on conflict (name) do update
+                set holder = excluded.holder, expires_at = excluded.expires_at
+                where leader_leases.holder = excluded.holder
+                   or leader_leases.expires_at < now();
+            return found;
+        end $$;
+
+    The lease clock starts when the database runs the call, so renewals are
+    timed from when they were sent. A leader whose renewals keep failing steps
+    down ``lease_ttl / 3`` before its lease can have expired, which leaves that
+    margin for stopping the monitor before another host may take over.
+    """
+
+    def __init__(
+        self,
+        lock_path: str,
+        poll_interval: float = 5.0,
+        use_db_lease: bool = False,
+        lease_ttl: int = 30,
+        name: str = "telegram_monitor",
+    ):
+        self.lock_path = lock_path
+        self.poll_interval = poll_interval
+        self.use_db_lease = use_db_lease
+        self.lease_ttl = lease_ttl
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.is_leader = False
+        self._lock_fd: Optional[int] = None
+        # monotonic time the last successful renewal was sent
+        self._lease_renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._on_elected: Optional[Callable[[], Awaitable[None]]] = None
+        self._on_demoted: Optional[Callable[[], Awaitable[None]]] = None
+
+    @property
+    def role(self) -> str:
+        return "leader" if self.is_leader else "follower"
+
+    def _try_file_lock(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        os.ftruncate(fd, 0)
+        os.write(fd, self.holder.encode())
+        self._lock_fd = fd
+        return True
+
+    def _release_file_lock(self):
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    @staticmethod
+    def _headers():
+        return {
+            "apikey": Config.SUPABASE_KEY,
+            "Authorization": f"Bearer {Config.SUPABASE_KEY}",
+            "Content-Type": "application/json",
+        }
+
+    @property
+    def _renew_deadline(self) -> float:
+        """Seconds after the last successful renewal at which a leader must step down"""
+        return self.lease_ttl - self.lease_ttl / 3
+
+    def _lease_remaining(self) -> float:
+        return self._renew_deadline - (time.monotonic() - self._lease_renewed_at)
+
+    async def _try_db_lease(self, timeout: float = 10.0) -> Optional[bool]:
+        """Take or renew the lease row; False if another holder owns it, None if the call failed"""
+        url = f"{Config.SUPABASE_URL}/rest/v1/rpc/acquire_leader_lease"
+        payload = {"lease_name": self.name, "lease_holder": self.holder, "ttl_seconds": self.lease_ttl}
+
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, headers=self._headers(), json=payload, timeout=timeout)
+                response.raise_for_status()
+                return response.json() is True
+        except Exception as e:
+            print(f"⚠️ Leader lease check failed: {e}")
+            return None
+
+    async def _release_db_lease(self):
+        """Drop our lease row so another host does not have to wait for it to expire"""
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.delete(
+                    f"{Config.SUPABASE_URL}/rest/v1/leader_leases",
+                    headers=self._headers(),
+                    params={"name": f"eq.{self.name}", "holder": f"eq.{self.holder}"},
+                    timeout=10,
+                )
+                response.raise_for_status()
+        except Exception as e:
+            print(f"⚠️ Leader lease release failed: {e}")
+
+    async def _try_acquire(self) -> bool:
+        if not self._try_file_lock():
+            return False
+        if not self.use_db_lease:
+            return True
+
+        timeout = 10.0
+        if self.is_leader:
+            # A renewal still in flight at the deadline must not keep us leading past it
+            timeout = min(timeout, self._lease_remaining())
+            if timeout <= 0:
+                self._release_file_lock()
+                return False
+
+        sent_at = time.monotonic()
+        leased = await self._try_db_lease(timeout)
+        if leased:
+            self._lease_renewed_at = sent_at
+            return True
+        if leased is None and self.is_leader and self._lease_remaining() > 0:
+            # A failed renewal is not a lost lease: ours is still valid, so keep leading and retry
+            return True
+
+        # Another host holds the lease (or ours has run out); let a sibling worker try next round
+        self._release_file_lock()
+        return False
+
+    async def start(
+        self,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        """Begin campaigning; ``on_elected`` runs each time this process becomes leader"""
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._task = asyncio.create_task(self._campaign())
+
+    async def _campaign(self):
+        while True:
+            try:
+                acquired = await self._try_acquire()
+
+                if acquired and not self.is_leader:
+                    self.is_leader = True
+                    print(f"👑 Elected leader ({self.holder})")
+                    await self._on_elected()
+                elif not acquired and self.is_leader:
+                    # Only reachable with the DB lease: it was taken over or went unrenewed too long
+                    self.is_leader = False
+                    print(f"⚠️ Lost leadership ({self.holder})")
+                    if self._on_demoted:
+                        await self._on_demoted()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Leader election error: {e}")
+
+            # Leaders only need to renew the DB lease; file locks hold until exit
+            if self.is_leader and not self.use_db_lease:
+                return
+            if self.is_leader:
+                # Wake up by the deadline at the latest, so a leader never outlives its lease
+                await asyncio.sleep(max(0.0, min(self.lease_ttl / 3, self._lease_remaining())))
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+    async def stop(self):
+        """Stop campaigning and release leadership so a follower can take over"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.is_leader and self.use_db_lease:
+            await self._release_db_lease()
+        self.is_leader = False
+        self._release_file_lock()
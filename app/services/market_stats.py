@@ -0,0 +1,371 @@
+import fcntl
+import json
+import math
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+VERSION = 1
+DAY = 86400
+
+# (make, model, year); year is None when the listing did not state one
+BucketKey = Tuple[str, str, Optional[int]]
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch over positive values (DDSketch).
+
+    Values fall into logarithmic bins of width ``gamma``, so any quantile is
+    answered within ``relative_accuracy`` of the true value and two sketches
+    merge by adding their bin counts. When there are more than ``max_bins``
+    bins the lowest ones are collapsed, which only costs accuracy at the
+    cheap end of the distribution.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 512):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, weight: int = 1):
+        self.count += weight
+        if value <= 0:
+            self.zero_count += weight
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + weight
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - self.max_bins + 1]
+        merged = sum(self.bins.pop(index) for index in excess)
+        target = indexes[len(excess)]
+        self.bins[target] += merged
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, weight in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + weight
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Midpoint of the bin (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "bins": {str(index): weight for index, weight in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_bins: int = 512) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], max_bins)
+        sketch.zero_count = data["zero_count"]
+        sketch.bins = {int(index): weight for index, weight in data["bins"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+
+class Aggregate:
+    """Count, mean, min, max and quantiles of listing prices"""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, price: float):
+        self.count += 1
+        self.total += price
+        self.min = min(self.min, price)
+        self.max = max(self.max, price)
+        self.sketch.add(price)
+
+    def merge(self, other: "Aggregate"):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def summary(self, quantiles: Iterable[float]) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2),
+            "min": self.min,
+            "max": self.max,
+            # Bin midpoints can fall just outside the observed range; min and max are exact
+            "quantiles": {
+                f"p{round(q * 100, 1):g}": _round(min(max(self.sketch.quantile(q), self.min), self.max))
+                for q in quantiles
+            },
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max,
+                "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Aggregate":
+        aggregate = cls(data["sketch"]["relative_accuracy"])
+        aggregate.count = data["count"]
+        aggregate.total = data["total"]
+        aggregate.min = data["min"] if data["min"] is not None else math.inf
+        aggregate.max = data["max"] if data["max"] is not None else -math.inf
+        aggregate.sketch = QuantileSketch.from_dict(data["sketch"])
+        return aggregate
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+class Series:
+    """All-time aggregate of one bucket plus one aggregate per UTC day for the windows"""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.total = Aggregate(relative_accuracy)
+        self.days: Dict[int, Aggregate] = {}
+
+    def add(self, price: float, day: int):
+        self.total.add(price)
+        if day not in self.days:
+            self.days[day] = Aggregate(self.relative_accuracy)
+        self.days[day].add(price)
+
+    def merge(self, other: "Series"):
+        self.total.merge(other.total)
+        for day, aggregate in other.days.items():
+            if day in self.days:
+                self.days[day].merge(aggregate)
+            else:
+                self.days[day] = Aggregate.from_dict(aggregate.to_dict())
+
+    def prune(self, oldest_day: int):
+        for day in [day for day in self.days if day < oldest_day]:
+            del self.days[day]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"total": self.total.to_dict(),
+                "days": {str(day): aggregate.to_dict() for day, aggregate in self.days.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Series":
+        series = cls(data["total"]["sketch"]["relative_accuracy"])
+        series.total = Aggregate.from_dict(data["total"])
+        series.days = {int(day): Aggregate.from_dict(aggregate) for day, aggregate in data["days"].items()}
+        return series
+
+
+def _merge_into(target: Dict[BucketKey, Series], source: Dict[BucketKey, Series]):
+    for key, series in source.items():
+        if key not in target:
+            target[key] = Series(series.relative_accuracy)
+        target[key].merge(series)
+
+
+class MarketStats:
+    """Price statistics per make/model/year, updated as listings are ingested.
+
+    Only the leaf buckets are stored; a query for a make or make/model merges
+    the matching buckets, which the sketches make exact up to their accuracy.
+
+    Every worker keeps what it has seen since its last checkpoint in
+    ``_delta``. A checkpoint merges that delta into the shared file under an
+    ``flock`` and adopts the merged file as the new base, so workers converge
+    to the same numbers within one checkpoint interval and a restart resumes
+    from the file instead of rescanning the listings table.
+    """
+
+    def __init__(self, path: str = "market_stats.json", windows_days: Iterable[int] = (7, 30),
+                 relative_accuracy: float = 0.01):
+        self.path = path
+        self.windows_days = sorted(set(windows_days))
+        self.relative_accuracy = relative_accuracy
+        self._base: Dict[BucketKey, Series] = {}
+        self._delta: Dict[BucketKey, Series] = {}
+        self.recorded = 0
+        self.checkpointed_at: Optional[float] = None
+
+    @staticmethod
+    def bucket_key(product_data: Dict[str, Any]) -> Optional[BucketKey]:
+        make = str(product_data.get("make") or "").strip().lower()
+        model = str(product_data.get("model") or "").strip().lower()
+        if not make or not model:
+            return None
+        try:
+            year = int(float(product_data.get("year")))
+        except (TypeError, ValueError):
+            year = None
+        return make, model, year
+
+    def _oldest_day(self, now: float) -> int:
+        return int(now // DAY) - max(self.windows_days, default=0)
+
+    def record(self, listing: Dict[str, Any], now: float = None) -> bool:
+        """Add an ingested listing's price to its bucket, returns False if it has no usable price"""
+        product_data = listing.get("product_data") or {}
+        key = self.bucket_key(product_data)
+        try:
+            price = float(product_data.get("price"))
+        except (TypeError, ValueError):
+            return False
+        if key is None or not price > 0 or math.isinf(price):
+            return False
+
+        now = time.time() if now is None else now
+        for store in (self._base, self._delta):
+            if key not in store:
+                store[key] = Series(self.relative_accuracy)
+            store[key].add(price, int(now // DAY))
+        self.recorded += 1
+        return True
+
+    def query(self, make: str, model: str = None, year: int = None,
+              quantiles: Iterable[float] = (0.1, 0.25, 0.5, 0.75, 0.9), now: float = None) -> Dict[str, Any]:
+        """Summaries for every bucket under make[/model[/year]], all time and per window"""
+        make = make.strip().lower()
+        model = model.strip().lower() if model else None
+        now = time.time() if now is None else now
+        today = int(now // DAY)
+
+        total = Aggregate(self.relative_accuracy)
+        windows = {days: Aggregate(self.relative_accuracy) for days in self.windows_days}
+        buckets = 0
+        for (bucket_make, bucket_model, bucket_year), series in self._base.items():
+            if bucket_make != make or (model and bucket_model != model) or (year is not None and bucket_year != year):
+                continue
+            buckets += 1
+            total.merge(series.total)
+            for day, aggregate in series.days.items():
+                for days, window in windows.items():
+                    if day > today - days:
+                        window.merge(aggregate)
+
+        quantiles = list(quantiles)
+        return {
+            "make": make,
+            "model": model,
+            "year": year,
+            "buckets": buckets,
+            "all_time": total.summary(quantiles),
+            "windows": {f"{days}d": window.summary(quantiles) for days, window in windows.items()},
+        }
+
+    def makes(self) -> Dict[str, int]:
+        """Listing counts per make"""
+        counts: Dict[str, int] = {}
+        for (make, _, _), series in self._base.items():
+            counts[make] = counts.get(make, 0) + series.total.count
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def models(self, make: str) -> Dict[str, Dict[str, int]]:
+        """Listing counts per model and year for one make"""
+        make = make.strip().lower()
+        models: Dict[str, Dict[str, int]] = {}
+        for (bucket_make, model, year), series in self._base.items():
+            if bucket_make == make:
+                years = models.setdefault(model, {})
+                years[str(year) if year is not None else "unknown"] = series.total.count
+        return models
+
+    @staticmethod
+    def _serialize(series: Dict[BucketKey, Series]) -> List[Dict[str, Any]]:
+        return [{"key": list(key), **s.to_dict()} for key, s in series.items()]
+
+    @staticmethod
+    def _deserialize(entries: List[Dict[str, Any]]) -> Dict[BucketKey, Series]:
+        return {tuple(entry["key"]): Series.from_dict(entry) for entry in entries}
+
+    def _read(self) -> Dict[BucketKey, Series]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            raise ValueError(f"Unsupported market stats checkpoint v{data.get('version')}")
+        return self._deserialize(data["series"])
+
+    def load(self) -> int:
+        """Adopt the checkpoint file as the base; returns the number of buckets"""
+        loaded = self._read()
+        _merge_into(loaded, self._delta)
+        self._base = loaded
+        return len(loaded)
+
+    def take_delta(self) -> Dict[BucketKey, Series]:
+        """Detach what was recorded since the last checkpoint (call on the event loop)"""
+        delta, self._delta = self._delta, {}
+        return delta
+
+    def write_checkpoint(self, delta: Dict[BucketKey, Series], now: float = None) -> Dict[BucketKey, Series]:
+        """Merge ``delta`` into the checkpoint file and return the merged buckets.
+
+        Blocking; meant for a worker thread. The file lock serializes
+        concurrent checkpoints from sibling workers.
+        """
+        now = time.time() if now is None else now
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                merged = self._read()
+                _merge_into(merged, delta)
+                oldest = self._oldest_day(now)
+                for series in merged.values():
+                    series.prune(oldest)
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump({"version": VERSION, "written_at": now, "series": self._serialize(merged)}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return merged
+
+    def adopt(self, merged: Dict[BucketKey, Series], now: float = None):
+        """Install a merged checkpoint plus anything recorded while it was written"""
+        _merge_into(merged, self._delta)
+        self._base = merged
+        self.checkpointed_at = time.time() if now is None else now
+
+    def restore_delta(self, delta: Dict[BucketKey, Series]):
+        """Put back a delta whose checkpoint failed so it is written next time"""
+        _merge_into(self._delta, delta)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buckets": len(self._base),
+            "pending_buckets": len(self._delta),
+            "recorded": self.recorded,
+            "windows_days": self.windows_days,
+            "checkpointed_at": self.checkpointed_at,
+        }
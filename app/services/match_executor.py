@@ -0,0 +1,203 @@
+import asyncio
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.services.preference_cache import CompiledBuyers, match_rows
+
+# Per-worker-process cache of attached shared memory: generation -> (blocks, columns)
+_worker_attached: Dict[int, Tuple[List[shared_memory.SharedMemory], Dict[str, memoryview]]] = {}
+
+
+def _detach_all():
+    """Release every attached generation; views must go before the blocks close"""
+    for old in list(_worker_attached):
+        blocks, columns = _worker_attached.pop(old)
+        for view in columns.values():
+            view.release()
+        for block in blocks:
+            block.close()
+
+
+def _attach(spec: Dict[str, Any]) -> Dict[str, memoryview]:
+    """Map a published generation into this worker, dropping older generations"""
+    generation = spec["generation"]
+    if generation in _worker_attached:
+        return _worker_attached[generation][1]
+
+    if not _worker_attached:
+        atexit.register(_detach_all)
+    _detach_all()
+
+    blocks, columns = [], {}
+    for name, (shm_name, typecode, length) in spec["columns"].items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(block)
+        columns[name] = block.buf.cast(typecode)[:length]
+    _worker_attached[generation] = (blocks, columns)
+    return columns
+
+
+def _match_shard(spec: Dict[str, Any], start: int, stop: int,
+                 batch: List[Tuple[int, int, float, float]]) -> List[List[int]]:
+    """Worker entry point: match a batch of encoded listings against one buyer shard"""
+    columns = _attach(spec)
+    return [match_rows(columns, start, stop, encoded) for encoded in batch]
+
+
+class _Generation:
+    """Shared memory blocks holding one compiled buyers generation"""
+
+    def __init__(self, compiled: CompiledBuyers):
+        self.generation = compiled.generation
+        # The index keeps changing in place after this copy: rows are only appended or tombstoned
+        self.source = compiled
+        self.rows = len(compiled)
+        self.blocks: List[shared_memory.SharedMemory] = []
+        self.spec: Dict[str, Any] = {"generation": compiled.generation, "columns": {}}
+
+        for name, column in compiled.columns().items():
+            data = column.tobytes()
+            # SharedMemory refuses zero-sized blocks
+            block = shared_memory.SharedMemory(create=True, size=max(len(data), column.itemsize))
+            block.buf[:len(data)] = data
+            self.blocks.append(block)
+            # Snapshot-backed columns are memoryviews, which expose .format instead of .typecode
+            typecode = getattr(column, "typecode", None) or column.format
+            self.spec["columns"][name] = (block.name, typecode, len(column))
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self.blocks = []
+
+
+class MatchExecutor:
+    """Runs the buyer filter either in-process or sharded across worker processes.
+
+    With ``workers == 0`` matching happens on the calling thread against the
+    compiled arrays. With ``workers > 0`` the compiled columns are copied into
+    ``multiprocessing.shared_memory`` and buyers are split into contiguous row
+    ranges, one per worker. Listings that arrive while a batch is in flight are
+    queued and sent together as the next batch.
+
+    Buyer edits written through to the same index do not trigger a new copy
+    until ``max_tail`` rows were appended after it: the appended rows are
+    matched in-process and the workers' rows are re-checked against the live
+    columns, which drops buyers tombstoned since the copy was made.
+    """
+
+    def __init__(self, workers: int = 0, max_batch: int = 64, max_tail: int = 1024):
+        self.workers = max(0, workers)
+        self.max_batch = max_batch
+        self.max_tail = max_tail
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._current: Optional[_Generation] = None
+        self._previous: Optional[_Generation] = None
+        self._pending: List[Tuple[CompiledBuyers, Tuple[int, int, float, float], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def mode(self) -> str:
+        return f"sharded[{self.workers}]" if self.workers else "in-process"
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn keeps workers free of the event loop and Telethon state of the parent
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            print(f"🧵 Match executor started with {self.workers} worker processes")
+        return self._pool
+
+    def _publish(self, compiled: CompiledBuyers) -> _Generation:
+        current = self._current
+        if current and current.source is compiled and (
+            current.generation == compiled.generation or len(compiled) - current.rows <= self.max_tail
+        ):
+            return current
+
+        # Keep the previous generation mapped so batches queued against it can still attach
+        if self._previous:
+            self._previous.release()
+        self._previous = self._current
+        self._current = _Generation(compiled)
+        return self._current
+
+    def _shards(self, size: int) -> List[Tuple[int, int]]:
+        step = -(-size // self.workers) if size else 0
+        return [(start, min(start + step, size)) for start in range(0, size, step)] if step else []
+
+    async def match(self, compiled: CompiledBuyers, listing: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return the buyers whose compiled filters accept ``listing``"""
+        encoded = compiled.encode_listing(listing)
+        if encoded is None or not len(compiled):
+            return []
+
+        if not self.workers:
+            rows = match_rows(compiled.columns(), 0, len(compiled), encoded)
+            return [compiled.buyers[row] for row in rows]
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((compiled, encoded, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        while self._pending:
+            # Take the longest run of pending listings that share a generation
+            compiled = self._pending[0][0]
+            batch = []
+            while (self._pending and len(batch) < self.max_batch
+                   and self._pending[0][0] is compiled):
+                batch.append(self._pending.pop(0))
+
+            try:
+                rows_per_listing = await self._run_batch(compiled, [encoded for _, encoded, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, _, future), rows in zip(batch, rows_per_listing):
+                if not future.done():
+                    future.set_result([compiled.buyers[row] for row in rows])
+
+    async def _run_batch(self, compiled: CompiledBuyers,
+                         encoded: List[Tuple[int, int, float, float]]) -> List[List[int]]:
+        pool = self._ensure_pool()
+        generation = self._publish(compiled)
+        loop = asyncio.get_running_loop()
+
+        shard_results = await asyncio.gather(*[
+            loop.run_in_executor(pool, _match_shard, generation.spec, start, stop, encoded)
+            for start, stop in self._shards(generation.rows)
+        ])
+
+        # Checked after the await: the index may have changed while the workers ran
+        stale = generation.generation != compiled.generation
+        columns = compiled.columns()
+        merged: List[List[int]] = []
+        for index, listing in enumerate(encoded):
+            rows = [row for shard in shard_results for row in shard[index]]
+            if stale:
+                rows = [row for row in rows if match_rows(columns, row, row + 1, listing)]
+                rows.extend(match_rows(columns, generation.rows, len(compiled), listing))
+            merged.append(rows)
+        return merged
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        for generation in (self._previous, self._current):
+            if generation:
+                generation.release()
+        self._previous = self._current = None
@@ -0,0 +1,97 @@
+import heapq
+from itertools import count
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Years above the buyer's minimum at which the year component saturates
+YEAR_HEADROOM_SCALE = 10.0
+
+DEFAULT_WEIGHTS = {"price": 0.5, "year": 0.3, "specificity": 0.2}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse ``"price=0.5,year=0.3,specificity=0.2"``; missing keys keep their defaults"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"Unknown match score weight: {name}")
+        weights[name] = float(value)
+    return weights
+
+
+class MatchScorer:
+    """Ranks buyers that already passed the boolean filter for a listing.
+
+    Each component is in [0, 1]:
+
+    * ``price``: where the listing sits in the buyer's budget, 1 at the bottom
+      of the range (a bargain for them), 0 at the top.
+    * ``year``: how far the listing is above the buyer's ``min_year``.
+    * ``specificity``: how narrow the search is, so a buyer asking for exactly
+      this model outranks one accepting anything.
+    """
+
+    def __init__(self, weights: Dict[str, float] = None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+    @staticmethod
+    def _as_list(value: Any) -> List[Any]:
+        if isinstance(value, list):
+            return value
+        return [value] if value else []
+
+    def components(self, listing: Dict[str, Any], buyer: Dict[str, Any]) -> Dict[str, float]:
+        preferences = buyer.get("preferences") or {}
+        product_data = listing.get("product_data") or {}
+
+        price = float(product_data.get("price", 0))
+        min_price = float(preferences.get("min_price", 0))
+        max_price = float(preferences.get("max_price", float("inf")))
+        if max_price != float("inf") and max_price > min_price:
+            price_score = (max_price - price) / (max_price - min_price)
+        else:
+            price_score = 0.5
+
+        year_score = 0.0
+        try:
+            min_year = float(preferences.get("min_year") or 0)
+            year = float(product_data.get("year") or 0)
+            if min_year and year:
+                year_score = min((year - min_year) / YEAR_HEADROOM_SCALE, 1.0)
+        except (TypeError, ValueError):
+            pass
+
+        makes = self._as_list(preferences.get("make"))
+        models = self._as_list(preferences.get("model"))
+        specificity = (
+            (1.0 / len(makes) if makes else 0.0)
+            + (1.0 / len(models) if models else 0.0)
+            + (1.0 if max_price != float("inf") else 0.0)
+            + (1.0 if preferences.get("min_year") else 0.0)
+        ) / 4
+
+        return {
+            "price": max(0.0, min(price_score, 1.0)),
+            "year": max(0.0, year_score),
+            "specificity": specificity,
+        }
+
+    def score(self, listing: Dict[str, Any], buyer: Dict[str, Any]) -> float:
+        parts = self.components(listing, buyer)
+        return sum(self.weights[name] * value for name, value in parts.items())
+
+    def top_k(self, listing: Dict[str, Any], buyers: Iterable[Dict[str, Any]], k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """Best ``k`` buyers by score, highest first, using a size-k min-heap over the stream"""
+        if k <= 0:
+            return []
+        heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        tiebreak = count()
+        for buyer in buyers:
+            entry = (self.score(listing, buyer), -next(tiebreak), buyer)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+
+        return [(score, buyer) for score, _, buyer in sorted(heap, key=lambda e: (e[0], e[1]), reverse=True)]
@@ -1,9 +1,19 @@
 import logging
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any, Optional
 import httpx
 import os
 from datetime import datetime
 from config import Config  # Import your config
+from app.services.preference_cache import PreferenceCache, CompiledBuyers, is_houses
+from app.services.match_executor import MatchExecutor
+from app.services.match_scoring import MatchScorer, parse_weights
+from app.services.digest_service import DigestService, DIGEST, INSTANT
+from app.services import buyer_snapshot
+from app.services.market_stats import MarketStats
+from app.services.response_cache import response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +29,149 @@ HEADERS = {
 }
 
 
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable):
+    """Await ``awaitable`` and record how long it took under ``stage``"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = _elapsed_ms(started)
+
+
 class MatchingService:
     def __init__(self):
         self.base_url = f"{SUPABASE_URL}/rest/v1"
+        self.preference_cache = PreferenceCache(
+            ttl=Config.BUYER_CACHE_TTL,
+            watermark_column=Config.BUYER_WATERMARK_COLUMN,
+            full_reload_interval=Config.BUYER_FULL_RELOAD_INTERVAL,
+        )
+        self._snapshot_generation = None
+        self.match_executor = MatchExecutor(workers=Config.MATCH_WORKERS, max_tail=Config.MATCH_REPUBLISH_ROWS)
+        self.top_k = Config.MATCH_TOP_K
+        self.scorer = MatchScorer(parse_weights(Config.MATCH_SCORE_WEIGHTS))
+        self.ingest_rpc = Config.INGEST_RPC
+        self.digests = DigestService(
+            self.pending_digest_matches,
+            self.mark_matches_notified,
+            window=Config.DIGEST_WINDOW_SECONDS,
+            max_items=Config.DIGEST_MAX_ITEMS,
+            default_mode=Config.NOTIFY_MODE_DEFAULT,
+        )
+        self.market_stats = MarketStats(
+            Config.MARKET_STATS_PATH,
+            windows_days=[int(days) for days in Config.MARKET_STATS_WINDOWS.split(",") if days.strip()],
+            relative_accuracy=Config.MARKET_STATS_ACCURACY,
+        )
+        self._buyers_lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def startup(self):
+        """Open the pooled HTTP client and check that Supabase answers"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=Config.HTTP_POOL_SIZE),
+                timeout=30,
+            )
+        await self._get("buyers", {"select": "id", "limit": "1"})
+
+    async def warm_up(self):
+        """Load and compile buyers before the first listing needs them"""
+        if self.preference_cache.compiled is None:
+            await self._load_snapshot()
+        compiled = await self._get_compiled_buyers()
+        return len(compiled)
+
+    async def _load_snapshot(self):
+        """Install the on-disk buyer index and catch it up with buyers changed since"""
+        path = Config.BUYER_SNAPSHOT_PATH
+        if not path or not Config.BUYER_WATERMARK_COLUMN or not os.path.exists(path):
+            # Without a watermark column a snapshot cannot be caught up
+            return
+
+        try:
+            compiled = await asyncio.to_thread(buyer_snapshot.load_snapshot, path)
+        except Exception as e:
+            print(f"⚠️ Ignoring buyer snapshot {path}: {e}")
+            return
+
+        if compiled.watermark is None:
+            # Without a watermark the snapshot cannot be caught up, so a full load is needed anyway
+            print(f"⚠️ Buyer snapshot has no {compiled.watermark_column} watermark, doing a full load")
+            return
+
+        # Fetch the delta first: a snapshot that was never caught up must not be served
+        changes = await self._fetch_buyer_changes(compiled)
+        age = max(0.0, time.time() - compiled.written_at)
+        self.preference_cache.install(compiled, age=age)
+        self._snapshot_generation = compiled.generation
+        changed = self.preference_cache.apply_changes(changes)
+        print(f"📚 Buyer snapshot loaded: {len(compiled)} buyers, {changed} changed since {compiled.watermark}")
+
+    async def _fetch_buyer_changes(self, compiled: CompiledBuyers) -> List[Dict[str, Any]]:
+        column = compiled.watermark_column
+        return await self._get("buyers", {
+            "select": "*",
+            column: f"gt.{compiled.watermark}",
+            "order": f"{column}.asc",
+        })
+
+    async def _apply_buyer_changes(self) -> int:
+        changes = await self._fetch_buyer_changes(self.preference_cache.compiled)
+        return self.preference_cache.apply_changes(changes)
+
+    async def save_snapshot(self) -> bool:
+        """Write the buyer index to disk if it changed since the last write"""
+        compiled = self.preference_cache.compiled
+        path = Config.BUYER_SNAPSHOT_PATH
+        if not path or compiled is None or compiled.generation == self._snapshot_generation:
+            return False
+
+        generation = compiled.generation
+        captured = buyer_snapshot.capture(compiled)
+        size = await asyncio.to_thread(buyer_snapshot.write_snapshot, compiled, captured, path)
+        self._snapshot_generation = generation
+        print(f"💾 Buyer snapshot written: {captured[2]} buyers, {size} bytes (generation {generation})")
+        return True
+
+    async def load_market_stats(self) -> int:
+        """Resume market statistics from the last checkpoint"""
+        if not self.market_stats.path:
+            return 0
+        buckets = await asyncio.to_thread(self.market_stats.load)
+        print(f"📈 Market stats loaded: {buckets} buckets")
+        return buckets
+
+    async def checkpoint_market_stats(self) -> bool:
+        """Merge market stats recorded since the last checkpoint into the shared file"""
+        if not self.market_stats.path:
+            return False
+        delta = self.market_stats.take_delta()
+        try:
+            merged = await asyncio.to_thread(self.market_stats.write_checkpoint, delta)
+        except Exception:
+            self.market_stats.restore_delta(delta)
+            raise
+        self.market_stats.adopt(merged)
+        return True
+
+    async def shutdown(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _http(self):
+        """Yield the pooled client, or a one-off client before startup() has run"""
+        if self._client is not None:
+            yield self._client
+        else:
+            async with httpx.AsyncClient() as client:
+                yield client
 
     async def _get(self, table: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
         url = f"{SUPABASE_URL}/rest/v1/{table}"
@@ -31,14 +181,14 @@ class MatchingService:
             "Accept": "application/json"
         }
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             response = await client.get(url, headers=headers, params=params)
             response.raise_for_status()
             return response.json()
 
     async def _insert(self, table: str, data: Any) -> List[Dict[str, Any]]:
         """Generic INSERT request"""
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             try:
                 headers = {
                     "apikey": SUPABASE_KEY,
@@ -73,6 +223,40 @@ class MatchingService:
                 print(f"❌ Error: {str(e)}")
                 raise
 
+    async def _update(self, table: str, params: Dict[str, Any], data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Generic PATCH request for the rows selected by ``params``"""
+        async with self._http() as client:
+            response = await client.patch(
+                f"{self.base_url}/{table}",
+                headers=HEADERS,
+                params=params,
+                json=data,
+            )
+            response.raise_for_status()
+            return response.json()
+
+    async def _delete(self, table: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Generic DELETE request for the rows selected by ``params``"""
+        async with self._http() as client:
+            response = await client.delete(
+                f"{self.base_url}/{table}",
+                headers=HEADERS,
+                params=params,
+            )
+            response.raise_for_status()
+            return response.json()
+
+    async def _rpc(self, function: str, payload: Dict[str, Any]) -> Any:
+        """Call a Postgres function exposed by PostgREST"""
+        async with self._http() as client:
+            response = await client.post(
+                f"{self.base_url}/rpc/{function}",
+                headers=HEADERS,
+                json=payload,
+            )
+            response.raise_for_status()
+            return response.json()
+
     async def find_matches_for_listing(self, listing_id: str) -> List[Dict[str, Any]]:
         """Find all buyer matches for a given listing"""
         try:
@@ -92,24 +276,71 @@ class MatchingService:
             listing = listings[0]
             logger.info(f"Processing listing: {listing['product_data'].get('make')} {listing['product_data'].get('model')}")
 
-            buyers = await self._get("buyers", {"select": "*"})
-            matches = []
-
-            for buyer in buyers:
-                if self._is_match(listing, buyer):
-                    match = self._create_match_record(listing, [buyer])
-                    matches.append(match)
-
-            if matches:
-                await self._insert("matches", matches)
-                logger.info(f"Created {len(matches)} matches for listing {listing_id}")
+            if listing.get("active") is False:
+                logger.info(f"Listing {listing_id} is inactive, skipping matching")
+                return []
 
-            return matches
+            candidates = await self._find_candidates(listing)
+            return await self._store_matches(listing, self._qualified(listing, candidates))
 
         except Exception as e:
             logger.error(f"Error finding matches for listing {listing_id}: {str(e)}")
             return []
 
+    async def _find_candidates(self, listing: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Buyers whose compiled filters accept the listing; only its fields are needed, not its id"""
+        compiled = await self._get_compiled_buyers()
+        return await self.match_executor.match(compiled, listing)
+
+    def _qualified(self, listing: Dict[str, Any], candidates: List[Dict[str, Any]]):
+        # The compiled filter narrows the scan; _is_match stays the source of truth
+        return (buyer for buyer in candidates if self._is_match(listing, buyer))
+
+    def _build_matches(self, listing: Dict[str, Any], buyers, top_k: int = None) -> List[Any]:
+        """Match records for qualified buyers, as (buyer, record) pairs.
+
+        ``top_k`` overrides MATCH_TOP_K for this call; 0 keeps every buyer, unranked.
+        """
+        top_k = self.top_k if top_k is None else top_k
+        pairs = []
+        if top_k > 0:
+            # Ranked mode: fan-out is capped at the K best-scoring buyers
+            for score, buyer in self.scorer.top_k(listing, buyers, top_k):
+                match = self._create_match_record(listing, [buyer])
+                match["score"] = round(score, 4)
+                pairs.append((buyer, match))
+        else:
+            for buyer in buyers:
+                pairs.append((buyer, self._create_match_record(listing, [buyer])))
+        return pairs
+
+    async def _store_matches(self, listing: Dict[str, Any], buyers, top_k: int = None) -> List[Dict[str, Any]]:
+        """Insert match rows for qualified buyers, at most ``top_k`` of them in ranked mode"""
+        pairs = self._build_matches(listing, buyers, top_k)
+        matches = [match for _, match in pairs]
+        if not matches:
+            return matches
+
+        inserted = await self._insert("matches", matches)
+        self._matches_stored(listing, pairs, inserted)
+        return matches
+
+    def _matches_stored(self, listing: Dict[str, Any], pairs: List[Any], inserted: List[Dict[str, Any]]):
+        response_cache.invalidate(f"matches:{listing['id']}")
+        logger.info(f"Created {len(pairs)} matches for listing {listing['id']}")
+
+    async def _get_compiled_buyers(self) -> CompiledBuyers:
+        """Return the compiled buyers, reloading them from Supabase when the cache is stale"""
+        if self.preference_cache.is_stale():
+            async with self._buyers_lock:
+                if self.preference_cache.is_stale():
+                    if self.preference_cache.can_refresh_incrementally():
+                        await self._apply_buyer_changes()
+                    else:
+                        buyers = await self._get("buyers", {"select": "*"})
+                        self.preference_cache.load(buyers)
+        return self.preference_cache.compiled
+
     def _is_match(self, listing: Dict[str, Any], buyer: Dict[str, Any]) -> bool:
         """Check if a listing matches buyer preferences"""
         try:
@@ -130,6 +361,14 @@ class MatchingService:
             if not listing_make or not listing_model or not listing_price:
                 return False
 
+            if preferences.get("unsubscribed"):
+                return False
+
+            # Only the kind counts; labels differ between the bot, n8n and the listings
+            category = listing.get("category")
+            if category and is_houses(preferences.get("product_type")) != is_houses(category):
+                return False
+
             if buyer_makes and listing_make not in [m.lower() for m in buyer_makes]:
                 return False
 
@@ -185,26 +424,248 @@ class MatchingService:
         }
     
     async def process_listing_and_match(self, listing_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Complete workflow: create listing and find matches"""
+        """Complete workflow: create listing and find matches.
+
+        Idempotent on ``telegram_message_id``: the monitor forwards seller edits
+        to the same n8n webhook, so a message that is already stored is applied
+        as an edit instead of becoming a second listing.
+        """
+        message_id = listing_data.get("telegram_message_id")
+        if message_id is not None:
+            try:
+                existing = await self._get(
+                    "listings", {"select": "id", "telegram_message_id": f"eq.{message_id}", "limit": "1"}
+                )
+            except Exception as e:
+                logger.error(f"Error in process_listing_and_match: {str(e)}")
+                return {"success": False, "error": str(e)}
+            if existing:
+                return await self.update_listing_and_rematch(listing_data)
+        return await self._create_listing_and_match(listing_data)
+
+    async def _create_listing_and_match(self, listing_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a new listing and its matches.
+
+        The buyer lookup only needs the listing's fields, so it runs while the
+        insert is in flight and the inserted row is matched as returned, without
+        reading it back. With INGEST_RPC set, the listing and its matches are
+        written by a single database call instead.
+        """
+        timings = {}
+        started = time.perf_counter()
         try:
-            listing_insert = await self._insert("listings", listing_data)
+            if self.ingest_rpc:
+                result = await self._ingest_via_rpc(listing_data, timings)
+                if result is not None:
+                    listing, matches = result
+                    self.market_stats.record(listing)
+                    timings["total"] = _elapsed_ms(started)
+                    return {
+                        "success": True,
+                        "listing": listing,
+                        "matches": matches,
+                        "match_count": len(matches),
+                        "timings_ms": timings,
+                    }
+
+            lookup = asyncio.create_task(_timed(timings, "buyer_lookup", self._find_candidates(listing_data)))
+            try:
+                listing_insert = await _timed(timings, "insert_listing", self._insert("listings", listing_data))
+            except Exception:
+                lookup.cancel()
+                raise
             if not listing_insert:
+                lookup.cancel()
                 return {"success": False, "error": "Failed to create listing"}
 
             listing = listing_insert[0]
-            matches = await self.find_matches_for_listing(listing["id"])
+            response_cache.invalidate("listings", f"listing:{listing['id']}")
+            self.market_stats.record(listing)
 
+            matches = []
+            try:
+                candidates = await lookup
+                if listing.get("active") is not False:
+                    matches = await _timed(
+                        timings, "store_matches",
+                        self._store_matches(listing, self._qualified(listing, candidates)),
+                    )
+            except Exception as e:
+                # The listing is stored either way; a failed match pass must not fail the ingest
+                logger.error(f"Error finding matches for listing {listing['id']}: {str(e)}")
+
+            timings["total"] = _elapsed_ms(started)
             return {
                 "success": True,
                 "listing": listing,
                 "matches": matches,
                 "match_count": len(matches),
+                "timings_ms": timings,
             }
 
         except Exception as e:
             logger.error(f"Error in process_listing_and_match: {str(e)}")
             return {"success": False, "error": str(e)}
+
+    async def _ingest_via_rpc(self, listing_data: Dict[str, Any], timings: Dict[str, float]):
+        """Store a listing and its matches atomically in one round trip.
+
+        Returns (listing, matches), or None when the function is missing so the
+        caller falls back to separate inserts. Only the columns present in the
+        payload are written, so table defaults still apply::
+
+            create function ingest_listing(listing jsonb, matches jsonb)
+            returns jsonb language plpgsql as $$
+            declare
+                cols text;
+                new_listing jsonb;
+                new_matches jsonb := '[]';
+            begin
+                select string_agg(quote_ident(key), ', ') into cols from jsonb_object_keys(listing) as key;
+                execute format(
+                    'insert into listings (%1$s) select %1$s from jsonb_populate_record(null::listings, $1)
+                     returning to_jsonb(listings)', cols
+                ) using listing into new_listing;
+
+                if jsonb_array_length(matches) > 0 then
+                    select string_agg(quote_ident(key), ', ') into cols from jsonb_object_keys(matches -> 0) as key;
+                    execute format(
+                        'with rows as (insert into matches (%1$s) select %1$s
+                                       from jsonb_populate_recordset(null::matches, $1) returning *)
+                         select coalesce(jsonb_agg(to_jsonb(rows)), ''[]'') from rows', cols
+                    ) using (
+                        select jsonb_agg(m || jsonb_build_object('listing_id', new_listing -> 'id'))
+                        from jsonb_array_elements(matches) as m
+                    ) into new_matches;
+                end if;
+
+                return jsonb_build_object('listing', new_listing, 'matches', new_matches);
+            end $$;
+        """
+        # Match rows are built before the listing has an id; the function fills in listing_id
+        provisional = {**listing_data, "id": None}
+        pairs = []
+        if listing_data.get("active") is not False:
+            candidates = await _timed(timings, "buyer_lookup", self._find_candidates(provisional))
+            pairs = self._build_matches(provisional, self._qualified(provisional, candidates))
+
+        try:
+            result = await _timed(timings, "ingest_rpc", self._rpc(self.ingest_rpc, {
+                "listing": listing_data,
+                "matches": [match for _, match in pairs],
+            }))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            print(f"⚠️ Ingest function {self.ingest_rpc} not found, falling back to separate inserts")
+            self.ingest_rpc = ""
+            timings.clear()
+            return None
+
+        listing = result["listing"]
+        matches = result.get("matches") or []
+        response_cache.invalidate("listings", f"listing:{listing['id']}")
+        if matches:
+            self._matches_stored(listing, pairs, matches)
+        return listing, matches
         
+    async def update_listing_and_rematch(self, listing_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply a seller's edit to their listing and re-match only the buyers it affects"""
+        try:
+            message_id = listing_data.get("telegram_message_id")
+            if message_id is None:
+                return {"success": False, "error": "telegram_message_id is required"}
+
+            existing = await self._get("listings", {"telegram_message_id": f"eq.{message_id}"})
+            if not existing:
+                # Edited before we ever stored it: treat it as a new listing
+                return await self._create_listing_and_match(listing_data)
+
+            old = existing[0]
+            updated = await self._update("listings", {"id": f"eq.{old['id']}"}, listing_data)
+            listing = updated[0] if updated else {**old, **listing_data}
+            response_cache.invalidate("listings", f"listing:{listing['id']}")
+
+            compiled = await self._get_compiled_buyers()
+            old_encoded = compiled.encode_listing(old)
+            new_encoded = compiled.encode_listing(listing)
+
+            entering_rows = compiled.rows_entering(old_encoded, new_encoded) if new_encoded else []
+            if entering_rows is None:
+                # Make or model changed, so every buyer is a candidate
+                candidates = await self.match_executor.match(compiled, listing)
+            else:
+                candidates = [compiled.buyers[row] for row in entering_rows]
+            entering = (
+                buyer for buyer in candidates
+                if self._is_match(listing, buyer) and not self._is_match(old, buyer)
+            )
+
+            # Buyers the listing no longer fits lose their not-yet-sent matches
+            suppressed = await self._suppress_unnotified_matches(
+                [listing["id"]], keep=lambda buyer: self._is_match(listing, buyer)
+            )
+
+            if self.top_k > 0:
+                # Ranked mode: the listing keeps at most K matches in total, edits included
+                stored = await self._get("matches", {"select": "id", "listing_id": f"eq.{listing['id']}"})
+                room = self.top_k - len(stored)
+                matches = await self._store_matches(listing, entering, room) if room > 0 else []
+            else:
+                matches = await self._store_matches(listing, entering)
+
+            return {
+                "success": True,
+                "listing": listing,
+                "matches": matches,
+                "match_count": len(matches),
+                "suppressed_count": len(suppressed),
+                "rematch": "full" if entering_rows is None else f"delta ({len(candidates)} candidates)",
+            }
+
+        except Exception as e:
+            logger.error(f"Error in update_listing_and_rematch: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    async def deactivate_listings_for_messages(self, message_ids: List[int]) -> Dict[str, Any]:
+        """Mark listings of deleted seller messages inactive and drop their pending matches"""
+        if not message_ids:
+            return {"deactivated": 0, "suppressed": 0}
+
+        ids = ",".join(str(message_id) for message_id in message_ids)
+        listings = await self._update("listings", {"telegram_message_id": f"in.({ids})"}, {"active": False})
+        listing_ids = [listing["id"] for listing in listings]
+        response_cache.invalidate("listings", *[f"listing:{listing_id}" for listing_id in listing_ids])
+
+        suppressed = await self._suppress_unnotified_matches(listing_ids)
+        logger.info(f"Deactivated {len(listing_ids)} listings, suppressed {len(suppressed)} matches")
+        return {"deactivated": len(listing_ids), "suppressed": len(suppressed)}
+
+    async def _suppress_unnotified_matches(self, listing_ids: List[Any], keep=None) -> List[Any]:
+        """Delete unnotified matches of ``listing_ids`` except those whose buyer ``keep`` accepts"""
+        if not listing_ids:
+            return []
+
+        ids = ",".join(str(listing_id) for listing_id in listing_ids)
+        pending = await self._get("matches", {
+            "select": "id,listing_id,buyers",
+            "listing_id": f"in.({ids})",
+            "notified": "eq.false",
+        })
+
+        compiled = self.preference_cache.compiled
+        stale = []
+        for row in pending:
+            buyer_ref = (row.get("buyers") or [{}])[0]
+            buyer = compiled.get_buyer(buyer_ref.get("id")) if compiled else None
+            if keep is None or buyer is None or not keep(buyer):
+                stale.append(row["id"])
+
+        if stale:
+            await self._delete("matches", {"id": f"in.({','.join(str(i) for i in stale)})"})
+            response_cache.invalidate(*[f"matches:{listing_id}" for listing_id in listing_ids])
+        return stale
+
     async def get_existing_matches(self, listing_id: str = None, notified: bool = None) -> List[Dict[str, Any]]:
         """Get existing matches from the database (READ operation)"""
         try:
@@ -222,6 +683,38 @@ class MatchingService:
         except Exception as e:
             logger.error(f"Error fetching matches: {str(e)}")
             return []
+
+    async def _unnotified_by_mode(self, mode: str) -> List[Any]:
+        """Unnotified match rows paired with their buyer, for buyers whose notification_mode is ``mode``"""
+        compiled = await self._get_compiled_buyers()
+        rows = await self.get_existing_matches(notified=False)
+        pairs = []
+        for row in rows:
+            buyer_ref = (row.get("buyers") or [{}])[0]
+            buyer = compiled.get_buyer(buyer_ref.get("id"))
+            if self.digests.mode_for(buyer) == mode:
+                pairs.append((buyer, row))
+        return pairs
+
+    async def get_instant_matches(self) -> List[Dict[str, Any]]:
+        """Unnotified matches for the per-match notifier; digest-mode buyers' rows are left to the digests"""
+        return [row for _, row in await self._unnotified_by_mode(INSTANT)]
+
+    async def pending_digest_matches(self) -> List[Any]:
+        return await self._unnotified_by_mode(DIGEST)
+
+    async def mark_matches_notified(self, match_ids: List[Any]) -> List[Dict[str, Any]]:
+        """Flag matches as notified in one bulk update (WRITE operation)"""
+        if not match_ids:
+            return []
+
+        ids = ",".join(str(match_id) for match_id in match_ids)
+        updated = await self._update("matches", {"id": f"in.({ids})"}, {"notified": True})
+
+        listing_ids = {row.get("listing_id") for row in updated}
+        response_cache.invalidate(*[f"matches:{listing_id}" for listing_id in listing_ids])
+        logger.info(f"Marked {len(updated)} matches as notified")
+        return updated
         
     async def debug_insert(self):
         """Debug method to test basic insert"""
@@ -239,7 +732,7 @@ class MatchingService:
             print(f"🔍 DEBUG: Headers: {HEADERS}")
             print(f"🔍 DEBUG: URL: {self.base_url}/listings")
             
-            async with httpx.AsyncClient() as client:
+            async with self._http() as client:
                 response = await client.post(
                     f"{self.base_url}/listings",
                     headers=HEADERS,
@@ -250,6 +743,7 @@ class MatchingService:
                 print(f"🔍 DEBUG: Response text: {response.text}")
                 
                 response.raise_for_status()
+                response_cache.invalidate("listings")
                 return response.json()
                 
         except Exception as e:
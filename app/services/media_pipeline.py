@@ -0,0 +1,293 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    from PIL import Image
+except ImportError:  # Perceptual hashing is skipped without Pillow
+    Image = None
+
+# Bytes read per chunk when hashing a downloaded file
+HASH_CHUNK_SIZE = 1 << 16
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def message_media_path(store_dir: str, message_id: int) -> str:
+    return os.path.join(store_dir, "messages", f"{message_id}.json")
+
+
+def load_message_media(store_dir: str, message_id: int) -> Optional[Dict[str, Any]]:
+    """Stored photos of a message, read from disk so any worker can answer"""
+    return _read_json(message_media_path(store_dir, message_id))
+
+
+def dhash_file(path: str) -> Optional[int]:
+    """64-bit difference hash: survives re-encoding, resizing and light edits"""
+    if Image is None:
+        return None
+    with Image.open(path) as image:
+        # draft() lets JPEG decode straight at reduced size instead of full resolution
+        image.draft("L", (64, 64))
+        pixels = list(image.convert("L").resize((9, 8)).getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+class PerceptualIndex:
+    """Finds stored photos whose dHash is within ``max_distance`` bits.
+
+    The 64-bit hash is split into 8 bands of 8 bits. Two hashes that differ
+    in at most 7 bits must agree exactly on at least one band, so a lookup
+    only compares against photos sharing a band instead of every photo.
+    """
+
+    BANDS = 8
+
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = min(max_distance, self.BANDS - 1)
+        self._bands: List[Dict[int, Set[int]]] = [{} for _ in range(self.BANDS)]
+        self._owners: Dict[int, Set[int]] = {}
+
+    def _band_keys(self, phash: int):
+        for band in range(self.BANDS):
+            yield band, (phash >> (band * 8)) & 0xFF
+
+    def find(self, phash: int) -> Set[int]:
+        """Return message ids owning a photo near ``phash``"""
+        candidates = set()
+        for band, key in self._band_keys(phash):
+            candidates.update(self._bands[band].get(key, ()))
+
+        owners = set()
+        for candidate in candidates:
+            if bin(candidate ^ phash).count("1") <= self.max_distance:
+                owners.update(self._owners[candidate])
+        return owners
+
+    def add(self, phash: int, message_id: int):
+        if phash not in self._owners:
+            self._owners[phash] = set()
+            for band, key in self._band_keys(phash):
+                self._bands[band].setdefault(key, set()).add(phash)
+        self._owners[phash].add(message_id)
+
+    def remove(self, phash: int, message_ids: Set[int]):
+        owners = self._owners.get(phash)
+        if owners is None:
+            return
+        owners -= message_ids
+        if not owners:
+            del self._owners[phash]
+            for band, key in self._band_keys(phash):
+                members = self._bands[band].get(key)
+                if members is not None:
+                    members.discard(phash)
+                    if not members:
+                        del self._bands[band][key]
+
+
+class MediaPipeline:
+    """Downloads message photos in the background into a content-addressed store.
+
+    ``submit`` only enqueues, so the Telegram message handler never waits on a
+    download. A fixed number of workers drain the bounded queue; Telethon
+    streams each photo straight to a temporary file, which is hashed in
+    chunks and renamed to ``<store>/<sha[:2]>/<sha>.jpg``. Identical bytes are
+    therefore stored once, and the perceptual hash links reposts whose text
+    changed but whose photos did not.
+
+    Each photo gets a ``<sha>.json`` sidecar with its dHash and the messages
+    that posted it, and each message a ``messages/<id>.json`` result, so the
+    index is rebuilt by ``load`` after a restart and ``/media`` can be served
+    by any worker. Only the ``max_indexed`` most recently seen photos are
+    kept in memory; an exact repost of an older photo is still found through
+    its sidecar.
+    """
+
+    def __init__(self, store_dir: str, concurrency: int = 4, queue_size: int = 200, max_distance: int = 6,
+                 max_indexed: int = 50000):
+        self.store_dir = store_dir
+        self.concurrency = concurrency
+        self.max_indexed = max_indexed
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.index = PerceptualIndex(max_distance)
+        # sha256 -> message ids, least recently seen first; phashes kept alongside for eviction
+        self.by_sha: "OrderedDict[str, Set[int]]" = OrderedDict()
+        self._phash_by_sha: Dict[str, Optional[int]] = {}
+        self._sidecar_lock = asyncio.Lock()
+        self._workers: List[asyncio.Task] = []
+        self._client = None
+        self.dropped = 0
+
+        os.makedirs(os.path.join(self.store_dir, "tmp"), exist_ok=True)
+        os.makedirs(os.path.join(self.store_dir, "messages"), exist_ok=True)
+
+    def _remember(self, sha256: str, phash: Optional[int], message_ids: Set[int]):
+        """Add a photo's owners to the in-memory index, evicting the least recently seen photos"""
+        known = self.by_sha.setdefault(sha256, set())
+        known.update(message_ids)
+        self.by_sha.move_to_end(sha256)
+        self._phash_by_sha[sha256] = phash
+        if phash is not None:
+            for message_id in message_ids:
+                self.index.add(phash, message_id)
+
+        while len(self.by_sha) > self.max_indexed:
+            old_sha, owners = self.by_sha.popitem(last=False)
+            old_phash = self._phash_by_sha.pop(old_sha, None)
+            if old_phash is not None:
+                self.index.remove(old_phash, owners)
+
+    def _scan_sidecars(self) -> List[Dict[str, Any]]:
+        paths = glob.glob(os.path.join(self.store_dir, "??", "*.json"))
+        # Oldest first, so the newest photos are the ones left after the cap
+        paths.sort(key=lambda path: os.path.getmtime(path))
+        sidecars = []
+        for path in paths[-self.max_indexed:]:
+            sidecar = _read_json(path)
+            if sidecar:
+                sidecars.append(sidecar)
+        return sidecars
+
+    async def load(self) -> int:
+        """Rebuild the in-memory index from the sidecars in the store"""
+        sidecars = await asyncio.to_thread(self._scan_sidecars)
+        for sidecar in sidecars:
+            phash = int(sidecar["phash"], 16) if sidecar.get("phash") else None
+            self._remember(sidecar["sha256"], phash, set(sidecar.get("messages", [])))
+        print(f"🖼️ Media index loaded: {len(self.by_sha)} photos")
+        return len(self.by_sha)
+
+    def start(self, client):
+        self._client = client
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            print(f"🖼️ Media pipeline started with {self.concurrency} downloaders → {self.store_dir}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, message) -> bool:
+        """Queue a message's photo for download; never blocks the caller"""
+        if not getattr(message, "photo", None):
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"⚠️ Media queue full, skipping photo for message {message.id}")
+            return False
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.store_dir, sha256[:2], f"{sha256}.jpg")
+
+    async def _worker(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await self._process(message)
+            except Exception as e:
+                print(f"❌ Media processing failed for message {message.id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, message):
+        started = time.monotonic()
+        tmp_path = os.path.join(self.store_dir, "tmp", f"{uuid.uuid4().hex}.part")
+
+        try:
+            await self._client.download_media(message, file=tmp_path)
+            sha256, phash = await asyncio.to_thread(self._hash, tmp_path)
+
+            final_path = self.path_for(sha256)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        sidecar_path = f"{os.path.splitext(final_path)[0]}.json"
+        async with self._sidecar_lock:
+            if sha256 not in self.by_sha:
+                # Evicted from memory (or stored before a restart): its sidecar still knows the owners
+                sidecar = await asyncio.to_thread(_read_json, sidecar_path)
+                if sidecar:
+                    self._remember(sha256, phash, set(sidecar.get("messages", [])))
+
+            exact = self.by_sha.get(sha256, set()) - {message.id}
+            similar = (self.index.find(phash) - {message.id}) if phash is not None else set()
+            self._remember(sha256, phash, {message.id})
+
+            phash_hex = f"{phash:016x}" if phash is not None else None
+            result_path = message_media_path(self.store_dir, message.id)
+            result = await asyncio.to_thread(_read_json, result_path) or {"media": [], "repost_of": []}
+            if all(media["sha256"] != sha256 for media in result["media"]):
+                result["media"].append({"sha256": sha256, "phash": phash_hex, "path": final_path})
+            result["repost_of"] = sorted(set(result["repost_of"]) | exact | similar)
+
+            sidecar = {"sha256": sha256, "phash": phash_hex, "messages": sorted(self.by_sha[sha256])}
+            await asyncio.to_thread(_write_json, sidecar_path, sidecar)
+            await asyncio.to_thread(_write_json, result_path, result)
+
+        print(f"🖼️ Stored photo for message {message.id} ({sha256[:12]}) in {time.monotonic() - started:.2f}s")
+        if result["repost_of"]:
+            print(f"♻️ Message {message.id} reuses photos from messages {result['repost_of']}")
+
+    @staticmethod
+    def _hash(path: str):
+        sha256 = sha256_file(path)
+        try:
+            phash = dhash_file(path)
+        except Exception as e:
+            print(f"⚠️ Could not compute perceptual hash: {e}")
+            phash = None
+        return sha256, phash
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.dropped,
+            "indexed_photos": len(self.by_sha),
+            "max_indexed": self.max_indexed,
+        }
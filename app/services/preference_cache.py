@@ -0,0 +1,347 @@
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+# Code used for a listing make/model that no buyer mentions. It never equals a
+# real vocabulary code, so only buyers without that filter can match it.
+UNKNOWN_CODE = -1
+
+# Words marking a product type or listing category as property. Anything else,
+# including old n8n labels like "🚗 Vehicles", is treated as a vehicle search.
+HOUSE_WORDS = ("house", "stand")
+
+
+def is_houses(product_type: Any) -> bool:
+    """True only for types that are clearly houses/stands, compared case-insensitively"""
+    lowered = str(product_type or "").lower()
+    return any(word in lowered for word in HOUSE_WORDS)
+
+
+def _to_float(value: Any, default: float) -> Optional[float]:
+    """Coerce a preference/listing value to float, None if it cannot be parsed"""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CompiledBuyers:
+    """Column-oriented view of the buyers table used by the matcher.
+
+    Every buyer occupies one row. Numeric filters live in flat ``array('d')``
+    columns and the make/model filters are stored CSR style: the codes for
+    row ``i`` are ``codes[offsets[i]:offsets[i + 1]]``. An empty slice means
+    the buyer accepts any value.
+    """
+
+    def __init__(self, generation: int, watermark_column: str = "updated_at"):
+        self.generation = generation
+        self.watermark_column = watermark_column
+        # Newest watermark_column value seen; changes after it are applied as deltas
+        self.watermark: Optional[str] = None
+        self.buyers: List[Dict[str, Any]] = []
+        self.row_by_id: Dict[Any, int] = {}
+        self.vocab: Dict[str, int] = {}
+        self.min_price = array("d")
+        self.max_price = array("d")
+        self.min_year = array("d")
+        self.make_offsets = array("i", [0])
+        self.make_codes = array("i")
+        self.model_offsets = array("i", [0])
+        self.model_codes = array("i")
+        # Lazily built sorted (values, rows) per numeric column for interval lookups;
+        # appended rows are inserted in place and tombstoned rows keep their old
+        # entries, which is fine since every candidate is re-checked
+        self._sorted: Dict[str, Tuple[List[float], List[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.buyers)
+
+    def _code(self, value: Any) -> int:
+        key = str(value).lower()
+        if key not in self.vocab:
+            self.vocab[key] = len(self.vocab)
+        return self.vocab[key]
+
+    def _ensure_mutable(self):
+        """Hook for snapshot-backed instances whose columns start out read-only"""
+
+    def get_buyer(self, buyer_id: Any) -> Optional[Dict[str, Any]]:
+        row = self.row_by_id.get(buyer_id)
+        return self.buyers[row] if row is not None else None
+
+    def add(self, buyer: Dict[str, Any]) -> bool:
+        """Compile one buyer row, returns False for buyers that can never match"""
+        self._advance_watermark(buyer)
+        preferences = buyer.get("preferences") or {}
+        if preferences.get("unsubscribed"):
+            return False
+        if is_houses(preferences.get("product_type")):
+            # Listings are matched on make/model, so only vehicle searches can ever match
+            return False
+        min_price = _to_float(preferences.get("min_price"), 0.0)
+        max_price = _to_float(preferences.get("max_price"), float("inf"))
+        if min_price is None or max_price is None:
+            # MatchingService._is_match raises on these and treats them as no match
+            return False
+
+        min_year = _to_float(preferences.get("min_year") or None, 0.0) or 0.0
+
+        self._ensure_mutable()
+        row = len(self.buyers)
+        self.row_by_id[buyer.get("id")] = row
+        self.buyers.append(buyer)
+        self.min_price.append(min_price)
+        self.max_price.append(max_price)
+        self.min_year.append(min_year)
+        for name, (values, rows) in self._sorted.items():
+            value = getattr(self, name)[row]
+            position = bisect_right(values, value)
+            values.insert(position, value)
+            rows.insert(position, row)
+
+        for field, offsets, codes in (
+            ("make", self.make_offsets, self.make_codes),
+            ("model", self.model_offsets, self.model_codes),
+        ):
+            values = preferences.get(field)
+            if not isinstance(values, list):
+                values = [values] if values else []
+            codes.extend(self._code(v) for v in values)
+            offsets.append(len(codes))
+
+        return True
+
+    def _advance_watermark(self, buyer: Dict[str, Any]):
+        stamp = buyer.get(self.watermark_column)
+        if stamp and (self.watermark is None or str(stamp) > self.watermark):
+            self.watermark = str(stamp)
+
+    def remove(self, buyer_id: Any) -> bool:
+        """Tombstone a buyer's row: an empty price range that no listing can satisfy"""
+        row = self.row_by_id.pop(buyer_id, None)
+        if row is None:
+            return False
+        self._ensure_mutable()
+        self.min_price[row] = float("inf")
+        self.max_price[row] = float("-inf")
+        return True
+
+    def upsert(self, buyer: Dict[str, Any]) -> bool:
+        """Replace (or insert) a buyer without rebuilding the other rows"""
+        self.remove(buyer.get("id"))
+        return self.add(buyer)
+
+    def encode_listing(self, listing: Dict[str, Any]) -> Optional[Tuple[int, int, float, float]]:
+        """Translate a listing to (make_code, model_code, price, year) or None if it cannot match"""
+        product_data = listing.get("product_data") or {}
+        make = str(product_data.get("make", "")).lower()
+        model = str(product_data.get("model", "")).lower()
+        price = _to_float(product_data.get("price", 0), 0.0)
+
+        if not make or not model or not price:
+            return None
+
+        # A year we cannot compare is treated as missing; callers re-check
+        # candidates with the exact rules so this only widens the candidate set.
+        year = _to_float(product_data.get("year"), 0.0) or 0.0
+
+        return (
+            self.vocab.get(make, UNKNOWN_CODE),
+            self.vocab.get(model, UNKNOWN_CODE),
+            price,
+            year,
+        )
+
+    def _sorted_column(self, name: str) -> Tuple[List[float], List[int]]:
+        if name not in self._sorted:
+            column = getattr(self, name)
+            rows = sorted(range(len(column)), key=column.__getitem__)
+            self._sorted[name] = ([column[row] for row in rows], rows)
+        return self._sorted[name]
+
+    def _rows_between(self, name: str, low: float, high: float,
+                      include_low: bool, include_high: bool) -> List[int]:
+        values, rows = self._sorted_column(name)
+        start = (bisect_left if include_low else bisect_right)(values, low)
+        stop = (bisect_right if include_high else bisect_left)(values, high)
+        return rows[start:stop]
+
+    def rows_entering(self, old: Optional[Tuple[int, int, float, float]],
+                      new: Tuple[int, int, float, float]) -> Optional[List[int]]:
+        """Rows that accept ``new`` but rejected ``old`` because of price or year.
+
+        Only rows whose price or year window the listing moved into are looked
+        at, found by binary search over the sorted bound columns. Returns None
+        when the make or model changed, since then any buyer may be affected.
+        """
+        if old is None or old[:2] != new[:2]:
+            return None
+
+        _, _, old_price, old_year = old
+        _, _, new_price, new_year = new
+        candidates = set()
+
+        if new_price < old_price:
+            # Price dropped under the max_price of buyers that could not afford it before
+            candidates.update(self._rows_between("max_price", new_price, old_price, True, False))
+        elif new_price > old_price:
+            candidates.update(self._rows_between("min_price", old_price, new_price, False, True))
+
+        # A missing year passes every min_year, so only a known old year can have excluded anyone
+        if old_year and (not new_year or new_year > old_year):
+            candidates.update(self._rows_between(
+                "min_year", old_year, new_year or float("inf"), False, True
+            ))
+
+        columns = self.columns()
+        return sorted(row for row in candidates if match_rows(columns, row, row + 1, new))
+
+    def columns(self) -> Dict[str, array]:
+        return {
+            "min_price": self.min_price,
+            "max_price": self.max_price,
+            "min_year": self.min_year,
+            "make_offsets": self.make_offsets,
+            "make_codes": self.make_codes,
+            "model_offsets": self.model_offsets,
+            "model_codes": self.model_codes,
+        }
+
+
+def _accepts(offsets: Sequence[int], codes: Sequence[int], row: int, code: int) -> bool:
+    start, stop = offsets[row], offsets[row + 1]
+    if start == stop:
+        return True
+    for i in range(start, stop):
+        if codes[i] == code:
+            return True
+    return False
+
+
+def match_rows(columns: Dict[str, Sequence], start: int, stop: int,
+               encoded: Tuple[int, int, float, float]) -> List[int]:
+    """Return the rows in [start, stop) whose filters accept an encoded listing.
+
+    ``columns`` may hold arrays or memoryviews over shared memory, so this is
+    used unchanged by the in-process path and by the match worker processes.
+    """
+    make_code, model_code, price, year = encoded
+    min_price = columns["min_price"]
+    max_price = columns["max_price"]
+    min_year = columns["min_year"]
+    make_offsets, make_codes = columns["make_offsets"], columns["make_codes"]
+    model_offsets, model_codes = columns["model_offsets"], columns["model_codes"]
+
+    rows = []
+    for row in range(start, stop):
+        if not (min_price[row] <= price <= max_price[row]):
+            continue
+        if year and min_year[row] and year < min_year[row]:
+            continue
+        if not _accepts(make_offsets, make_codes, row, make_code):
+            continue
+        if not _accepts(model_offsets, model_codes, row, model_code):
+            continue
+        rows.append(row)
+    return rows
+
+
+class PreferenceCache:
+    """In-memory compiled buyer preferences, rebuilt when older than ``ttl`` seconds.
+
+    With a ``watermark_column`` the rebuilds between full reloads only fetch
+    buyers whose column is newer than the index. Supabase does not maintain
+    such a column by itself and n8n does not set it, so deltas are only safe
+    once this trigger is installed; without a column every refresh is a full
+    reload::
+
+        alter table buyers add column if not exists updated_at timestamptz not null default now();
+
+        create or replace function touch_buyer() returns trigger
+        language plpgsql as $$
+        begin
+          new.updated_at := now();
+          return new;
+        end $$;
+
+        create trigger buyers_touch before insert or update on buyers
+        for each row execute function touch_buyer();
+    """
+
+    def __init__(self, ttl: float = 60.0, watermark_column: str = "updated_at", full_reload_interval: float = 3600.0):
+        self.ttl = ttl
+        self.watermark_column = watermark_column
+        self.full_reload_interval = full_reload_interval
+        self.compiled: Optional[CompiledBuyers] = None
+        self.loaded_at = 0.0
+        # When the index last reflected a full download; deltas cannot see deleted buyers
+        self.full_loaded_at = 0.0
+        self._generation = 0
+
+    def is_stale(self) -> bool:
+        return self.compiled is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def can_refresh_incrementally(self) -> bool:
+        return (
+            self.compiled is not None
+            and self.compiled.watermark is not None
+            and time.monotonic() - self.full_loaded_at < self.full_reload_interval
+        )
+
+    def load(self, buyers: List[Dict[str, Any]]) -> CompiledBuyers:
+        """Compile a full buyers download and make it the current generation"""
+        self._generation += 1
+        compiled = CompiledBuyers(self._generation, self.watermark_column)
+        skipped = 0
+        for buyer in buyers:
+            if not compiled.add(buyer):
+                skipped += 1
+
+        self.compiled = compiled
+        self.loaded_at = self.full_loaded_at = time.monotonic()
+        print(f"📚 Buyer cache loaded: {len(compiled)} buyers (generation {compiled.generation}, skipped {skipped})")
+        return compiled
+
+    def install(self, compiled: CompiledBuyers, age: float = 0.0):
+        """Adopt an already compiled index, e.g. one loaded from a snapshot ``age`` seconds old"""
+        self._generation = max(self._generation, compiled.generation)
+        self.compiled = compiled
+        self.loaded_at = time.monotonic()
+        self.full_loaded_at = self.loaded_at - age
+
+    def apply_changes(self, buyers: List[Dict[str, Any]]) -> int:
+        """Upsert changed buyers into the current index as a new generation"""
+        if self.compiled is None:
+            return 0
+        self.loaded_at = time.monotonic()
+        if not buyers:
+            return 0
+
+        for buyer in buyers:
+            self.compiled.upsert(buyer)
+        self._bump_generation()
+        return len(buyers)
+
+    def write_through(self, buyer: Dict[str, Any]) -> bool:
+        """Apply a buyer this process just wrote, without waiting for the next refresh"""
+        if self.compiled is None:
+            return False
+
+        # Keep the watermark: a sibling worker may have written older rows we have not fetched yet
+        watermark = self.compiled.watermark
+        self.compiled.upsert(buyer)
+        self.compiled.watermark = watermark
+        self._bump_generation()
+        return True
+
+    def _bump_generation(self):
+        # Tells the sharded executor its shared memory copy is behind the index
+        self._generation += 1
+        self.compiled.generation = self._generation
+
+    def invalidate(self):
+        self.loaded_at = 0.0
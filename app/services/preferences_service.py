@@ -0,0 +1,165 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from app.services.matching_service import matching_service, MatchingService
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_TYPES = ("vehicles", "houses")
+NOTIFICATION_MODES = ("instant", "digest")
+MIN_YEAR_RANGE = (1950, datetime.utcnow().year + 1)
+
+
+def _as_names(value: Any, field: str) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{field} must be a string or a list of strings")
+    return [v.strip().lower() for v in value if v.strip()]
+
+
+def _as_price(value: Any, field: str) -> float:
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number")
+    if price < 0:
+        raise ValueError(f"{field} cannot be negative")
+    return price
+
+
+def normalize_preferences(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate preference fields; a value of None means "remove this filter".
+
+    Makes and models are stored lower-case, the way the matcher compares them.
+    """
+    normalized: Dict[str, Any] = {}
+    for field, value in changes.items():
+        if value is None:
+            normalized[field] = None
+        elif field in ("make", "model"):
+            normalized[field] = _as_names(value, field) or None
+        elif field in ("min_price", "max_price"):
+            normalized[field] = _as_price(value, field)
+        elif field == "min_year":
+            try:
+                year = int(value)
+            except (TypeError, ValueError):
+                raise ValueError("min_year must be a year")
+            if not MIN_YEAR_RANGE[0] <= year <= MIN_YEAR_RANGE[1]:
+                raise ValueError(f"min_year must be between {MIN_YEAR_RANGE[0]} and {MIN_YEAR_RANGE[1]}")
+            normalized[field] = year
+        elif field == "notification_mode":
+            if value not in NOTIFICATION_MODES:
+                raise ValueError(f"notification_mode must be one of {', '.join(NOTIFICATION_MODES)}")
+            normalized[field] = value
+        elif field == "product_type":
+            if value not in PRODUCT_TYPES:
+                raise ValueError(f"product_type must be one of {', '.join(PRODUCT_TYPES)}")
+            normalized[field] = value
+        elif field == "unsubscribed":
+            normalized[field] = bool(value) or None
+        else:
+            raise ValueError(f"Unknown preference: {field}")
+    return normalized
+
+
+def _apply(preferences: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(preferences or {})
+    for field, value in changes.items():
+        if value is None:
+            # The matcher reads missing keys as "any"; a stored null would break its float()
+            merged.pop(field, None)
+        else:
+            merged[field] = value
+
+    for field in ("min_price", "max_price"):
+        if field in merged:
+            try:
+                # Older rows hold prices as strings; they are saved back as numbers
+                merged[field] = _as_price(merged[field], field)
+            except ValueError:
+                logger.warning(f"Dropping unreadable stored {field}: {merged[field]!r}")
+                merged.pop(field)
+
+    min_price, max_price = merged.get("min_price"), merged.get("max_price")
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise ValueError("min_price cannot be above max_price")
+    return merged
+
+
+class PreferencesService:
+    """Buyer rows keyed by Telegram chat id.
+
+    Every write goes to Supabase first and the returned row is then written
+    through to the matcher's compiled buyer index, so an edited search is used
+    for the very next listing instead of after the next cache refresh.
+    """
+
+    def __init__(self, matching: MatchingService):
+        self.matching = matching
+
+    async def get_buyer(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        buyers = await self.matching._get("buyers", {"select": "*", "chat_id": f"eq.{chat_id}", "limit": "1"})
+        return buyers[0] if buyers else None
+
+    def _stamp(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        # Lets sibling workers pick the change up through their delta refresh
+        if Config.BUYER_WATERMARK_COLUMN:
+            row[Config.BUYER_WATERMARK_COLUMN] = datetime.utcnow().isoformat()
+        return row
+
+    def _write_through(self, buyer: Dict[str, Any]) -> Dict[str, Any]:
+        if self.matching.preference_cache.write_through(buyer):
+            logger.info(f"Buyer {buyer.get('id')} updated in the live match index")
+        return buyer
+
+    async def save_buyer(self, chat_id: int, name: str = None, cell_number: str = None,
+                         preferences: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Create the chat's buyer or update it; ``preferences`` are merged into the stored ones"""
+        changes = normalize_preferences(preferences or {})
+        existing = await self.get_buyer(chat_id)
+
+        row: Dict[str, Any] = {}
+        if name:
+            row["name"] = name
+        if cell_number:
+            row["cell_number"] = cell_number
+
+        if existing is None:
+            row["chat_id"] = chat_id
+            row.setdefault("name", "Unknown")
+            row.setdefault("cell_number", "")
+            row["preferences"] = _apply({}, changes)
+            inserted = await self.matching._insert("buyers", self._stamp(row))
+            return self._write_through(inserted[0])
+
+        row["preferences"] = _apply(existing.get("preferences"), changes)
+        updated = await self.matching._update("buyers", {"id": f"eq.{existing['id']}"}, self._stamp(row))
+        return self._write_through(updated[0] if updated else {**existing, **row})
+
+    async def update_preferences(self, chat_id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge preference changes into an existing buyer, None if the chat never registered"""
+        if await self.get_buyer(chat_id) is None:
+            return None
+        return await self.save_buyer(chat_id, preferences=changes)
+
+    async def replace_preferences(self, chat_id: int, preferences: Dict[str, Any], name: str = None,
+                                  cell_number: str = None) -> Dict[str, Any]:
+        """Set the buyer's whole preference object, creating the buyer if needed"""
+        normalized = normalize_preferences(preferences)
+        existing = await self.get_buyer(chat_id)
+        cleared = {field: None for field in ((existing or {}).get("preferences") or {}) if field not in normalized}
+        return await self.save_buyer(chat_id, name, cell_number, {**cleared, **normalized})
+
+    async def unsubscribe(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Stop matches for the chat's buyer while keeping its preferences for a later /register"""
+        return await self.update_preferences(chat_id, {"unsubscribed": True})
+
+
+# Create singleton instance
+preferences_service = PreferencesService(matching_service)
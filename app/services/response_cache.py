@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from config import Config
+
+
+class CachedResponse:
+    """Serialized JSON body plus the ETag derived from it"""
+
+    __slots__ = ("body", "etag", "expires_at", "tags")
+
+    def __init__(self, value: Any, ttl: float, tags: Iterable[str]):
+        self.body = json.dumps(value, default=str).encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.expires_at = time.monotonic() + ttl
+        self.tags = tuple(tags)
+
+
+class ResponseCache:
+    """Read-through LRU cache for JSON read endpoints.
+
+    Entries expire after ``ttl`` seconds and carry tags such as
+    ``listing:<id>`` so writes can drop everything derived from a row.
+    Concurrent misses for the same key share a single upstream call. A fetch
+    that was in flight while one of its tags was invalidated still answers its
+    waiters but is not stored, so a write is never masked by an older read.
+
+    Invalidation is local to the process. With several uvicorn workers the
+    others keep their copy until it expires, so endpoints whose staleness
+    matters (the n8n notifier polls /matches) pass a short per-key ``ttl``.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tag_versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: CachedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        tags: Iterable[str] = (),
+        ttl: Optional[float] = None,
+    ) -> CachedResponse:
+        """Return the cached response for ``key``, calling ``fetch`` once on a miss"""
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        tags = tuple(tags)
+        versions = [self._tag_versions.get(tag, 0) for tag in tags]
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        try:
+            entry = CachedResponse(await fetch(), self.ttl if ttl is None else ttl, tags)
+        except BaseException as e:
+            future.set_exception(e)
+            # Errors are never cached; mark retrieved so lone failures don't warn
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if versions == [self._tag_versions.get(tag, 0) for tag in tags]:
+            self._store(key, entry)
+        future.set_result(entry)
+        return entry
+
+    def invalidate(self, *tags: str):
+        """Drop every entry carrying any of ``tags``"""
+        tags = set(tags)
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+        for key in [k for k, e in self._entries.items() if tags.intersection(e.tags)]:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+# Create singleton instance
+response_cache = ResponseCache(max_entries=Config.RESPONSE_CACHE_SIZE, ttl=Config.RESPONSE_CACHE_TTL)
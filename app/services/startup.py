@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+
+class StartupStage:
+    """Status and timing of one startup subsystem"""
+
+    def __init__(self, name: str, required: bool):
+        self.name = name
+        self.required = required
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "duration_ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+
+class StartupTracker:
+    """Runs startup stages concurrently and records which ones are ready.
+
+    A stage is ``ready`` when its coroutine finishes, ``failed`` when it
+    raises, times out or returns ``False`` (the convention used by
+    ``TelegramMonitor.start``). The service is ready once every *required*
+    stage is ready; optional stages are reported but never block traffic.
+    """
+
+    def __init__(self, timeout: float = 60.0):
+        self.timeout = timeout
+        self.stages: Dict[str, StartupStage] = {}
+        self.started_at = time.monotonic()
+
+    def register(self, name: str, required: bool = True) -> StartupStage:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StartupStage(name, required)
+        return stage
+
+    async def run(self, name: str, coro: Awaitable[Any], required: bool = True) -> Any:
+        stage = self.register(name, required)
+        stage.status = "running"
+        stage.error = None
+        stage.started_at = time.monotonic()
+
+        try:
+            result = await asyncio.wait_for(coro, timeout=self.timeout)
+            stage.status = "failed" if result is False else "ready"
+            return result
+        except asyncio.TimeoutError:
+            stage.status = "failed"
+            stage.error = f"timed out after {self.timeout}s"
+        except asyncio.CancelledError:
+            stage.status = "failed"
+            stage.error = "cancelled"
+            raise
+        except Exception as e:
+            stage.status = "failed"
+            stage.error = str(e)
+        finally:
+            stage.duration = time.monotonic() - stage.started_at
+            icon = "✅" if stage.status == "ready" else "❌"
+            print(f"{icon} Startup stage {name}: {stage.status} in {stage.duration * 1000:.0f}ms")
+
+    @property
+    def is_ready(self) -> bool:
+        required = [stage for stage in self.stages.values() if stage.required]
+        return bool(required) and all(stage.status == "ready" for stage in required)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready,
+            "uptime_s": round(time.monotonic() - self.started_at, 1),
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+        }
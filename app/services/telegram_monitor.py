@@ -3,8 +3,11 @@ import asyncio
 import time
 import aiohttp
 import json
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils
+from telethon.tl.types import Chat
 from config import Config  # Import your config
+from app.services.media_pipeline import MediaPipeline
+from app.services.matching_service import matching_service
 
 class TelegramMonitor:
     def __init__(self):
@@ -17,6 +20,8 @@ class TelegramMonitor:
         self._monitor_task = None
         self._message_count = 0
         self._last_message_id = 0
+        self._group_peer_id = None
+        self._group_is_basic = False
         
         # Single group ID (you might want to move this to .env too)
         self.seller_group_id = Config.TELEGRAM_AUTOMOTA
@@ -24,6 +29,15 @@ class TelegramMonitor:
         # Your n8n webhook URL (from the activated workflow)
         self.n8n_webhook_url = "https://specify.app.n8n.cloud/webhook/telegram-messages"
         
+        # Photos are downloaded in the background, never inside the handler
+        self.media_pipeline = MediaPipeline(
+            Config.MEDIA_DIR,
+            concurrency=Config.MEDIA_CONCURRENCY,
+            queue_size=Config.MEDIA_QUEUE_SIZE,
+            max_distance=Config.MEDIA_PHASH_DISTANCE,
+            max_indexed=Config.MEDIA_INDEX_MAX,
+        )
+        
         print(f"🔧 TelegramMonitor initialized with API_ID: {self.api_id}")
     
     async def start(self):
@@ -45,14 +59,23 @@ class TelegramMonitor:
             print("🔐 Connecting to Telegram...")
             await self.client.start()
             
-            # Verify connection
-            me = await self.client.get_me()
+            # Verify connection and group access concurrently
+            me, group = await asyncio.gather(
+                self.client.get_me(),
+                self.client.get_entity(self.seller_group_id),
+                return_exceptions=True,
+            )
+            if isinstance(me, Exception):
+                raise me
             print(f"✅ Connected as: {me.first_name}")
             
             # Verify group access
             try:
-                group = await self.client.get_entity(self.seller_group_id)
+                if isinstance(group, Exception):
+                    raise group
                 group_name = getattr(group, 'title', 'Unknown')
+                self._group_peer_id = utils.get_peer_id(group)
+                self._group_is_basic = isinstance(group, Chat)
                 print(f"🎯 Monitoring: {group_name}")
                 
                 # Get the last message ID to only process new messages
@@ -73,8 +96,25 @@ class TelegramMonitor:
                 else:
                     print(f"⏩ Skipping old message ID: {event.message.id}")
             
+            # Sellers edit posts to change the price; n8n re-extracts and a known message id updates its listing
+            @self.client.on(events.MessageEdited(chats=[self.seller_group_id]))
+            async def edit_handler(event):
+                await self._handle_message(event, edited=True)
+            
+            # Deletions in basic groups (and private chats) arrive without a chat, so filter by hand
+            @self.client.on(events.MessageDeleted())
+            async def delete_handler(event):
+                if event.chat_id is None:
+                    # Only trust chat-less deletions when the seller group is itself a basic group
+                    if self._group_is_basic:
+                        await self._handle_deleted(event.deleted_ids)
+                elif event.chat_id == self._group_peer_id:
+                    await self._handle_deleted(event.deleted_ids)
+            
             self.is_running = True
             self._message_count = 0
+            await self.media_pipeline.load()
+            self.media_pipeline.start(self.client)
             
             print("👂 Listening for NEW messages only...")
             
@@ -99,24 +139,30 @@ class TelegramMonitor:
             self.is_running = False
             print("🛑 Telegram monitor stopped")
     
-    async def _handle_message(self, event):
-        """Handle incoming messages and send to n8n"""
+    async def _handle_message(self, event, edited=False):
+        """Handle incoming or edited messages and send to n8n"""
         try:
-            self._message_count += 1
+            if not edited:
+                self._message_count += 1
             sender = await event.get_sender()
             chat = await event.get_chat()
             
             message_text = event.message.text or ""
             preview = message_text[:100] + "..." if len(message_text) > 100 else message_text
             
-            print(f"📨 NEW MESSAGE #{self._message_count} at {time.strftime('%H:%M:%S')}")
+            label = "EDITED MESSAGE" if edited else "NEW MESSAGE"
+            print(f"📨 {label} #{self._message_count} at {time.strftime('%H:%M:%S')}")
             print(f"   From: {chat.title}")
             print(f"   Sender: {sender.first_name} (ID: {sender.id})")
             print(f"   Message: {preview}")
             print(f"   Message ID: {event.message.id}")
             
+            # An edit carries the photo that was already stored with the original post
+            if not edited and self.media_pipeline.submit(event.message):
+                print(f"   🖼️ Photo queued for download")
+            
             # Send to n8n for processing and storage
-            success = await self._send_to_n8n(event, sender, chat, message_text)
+            success = await self._send_to_n8n(event, sender, chat, message_text, edited=edited)
             
             if success:
                 print(f"   ✅ Sent to n8n → Supabase")
@@ -128,7 +174,16 @@ class TelegramMonitor:
         except Exception as e:
             print(f"❌ Error processing message: {e}")
     
-    async def _send_to_n8n(self, event, sender, chat, message_text):
+    async def _handle_deleted(self, message_ids):
+        """Deactivate listings whose seller message was deleted"""
+        try:
+            print(f"🗑️ Messages deleted: {message_ids}")
+            result = await matching_service.deactivate_listings_for_messages(message_ids)
+            print(f"   Deactivated {result['deactivated']} listings, suppressed {result['suppressed']} matches")
+        except Exception as e:
+            print(f"❌ Error handling deleted messages: {e}")
+    
+    async def _send_to_n8n(self, event, sender, chat, message_text, edited=False):
         """Send message data to n8n webhook"""
         try:
             message_data = {
@@ -140,6 +195,7 @@ class TelegramMonitor:
                 "chat_title": getattr(chat, 'title', 'Unknown'),
                 "message_id": event.message.id,
                 "timestamp": time.time(),
+                "edited": edited,
                 "extracted_data": self._extract_product_data(message_text)
             }
             
@@ -168,7 +224,8 @@ class TelegramMonitor:
             print(f"   ❌ n8n error: {e}")
             return False
     
-    def _extract_product_data(self, text):
+    @staticmethod
+    def _extract_product_data(text):
         """Extract product information from message text"""
         text_lower = text.lower()
         
@@ -194,6 +251,8 @@ class TelegramMonitor:
             except asyncio.CancelledError:
                 pass
         
+        await self.media_pipeline.stop()
+        
         if self.client and self.client.is_connected():
             await self.client.disconnect()
         
@@ -0,0 +1,32 @@
+import httpx
+from config import Config
+
+
+async def send_telegram_message(chat_id: int, text: str, keyboard: dict = None) -> bool:
+    """Send a plain message to a buyer through the Telegram Bot API, optionally with a reply keyboard"""
+    url = f"https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/sendMessage"
+    payload = {"chat_id": chat_id, "text": text}
+    if keyboard:
+        payload["reply_markup"] = keyboard
+    
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(url, json=payload, timeout=10)
+            
+        if response.status_code == 200:
+            return True
+        print(f"❌ Telegram send error {response.status_code}: {response.text}")
+        return False
+        
+    except Exception as e:
+        print(f"❌ Telegram send error: {e}")
+        return False
+
+
+def format_listing_line(product_data: dict) -> str:
+    """One-line summary of a listing for buyer notifications"""
+    title = " ".join(
+        str(product_data[key]) for key in ("year", "make", "model") if product_data.get(key)
+    )
+    price = product_data.get("price")
+    return f"{title} - {price}" if price else title
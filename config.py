@@ -9,7 +9,77 @@ class Config:
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+    TELEGRAM_AUTOMOTA = os.getenv("TELEGRAM_AUTOMOTA")
     ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+
+    # Matching: 0 workers matches in-process, N > 0 shards buyers across N processes
+    MATCH_WORKERS = int(os.getenv("MATCH_WORKERS", "0"))
+    # Buyer edits appended since the last shared memory copy before the workers get a new one
+    MATCH_REPUBLISH_ROWS = int(os.getenv("MATCH_REPUBLISH_ROWS", "1024"))
+    BUYER_CACHE_TTL = float(os.getenv("BUYER_CACHE_TTL", "60"))
+    # Buyer index snapshot for warm starts; refreshes between full reloads fetch
+    # only buyers whose BUYER_WATERMARK_COLUMN is newer than the index. Leave the
+    # column empty (full reload every BUYER_CACHE_TTL) until the trigger in
+    # PreferenceCache keeps it current, e.g. BUYER_WATERMARK_COLUMN=updated_at
+    BUYER_SNAPSHOT_PATH = os.getenv("BUYER_SNAPSHOT_PATH", "buyer_index.snapshot")
+    BUYER_SNAPSHOT_INTERVAL = float(os.getenv("BUYER_SNAPSHOT_INTERVAL", "300"))
+    BUYER_WATERMARK_COLUMN = os.getenv("BUYER_WATERMARK_COLUMN", "")
+    BUYER_FULL_RELOAD_INTERVAL = float(os.getenv("BUYER_FULL_RELOAD_INTERVAL", "3600"))
+    # Ranking: keep the best K buyers per listing (0 keeps every match, unranked)
+    MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "0"))
+    MATCH_SCORE_WEIGHTS = os.getenv("MATCH_SCORE_WEIGHTS", "price=0.5,year=0.3,specificity=0.2")
+    # Optional Postgres function that stores a listing and its matches in one call
+    # (SQL in MatchingService._ingest_via_rpc); empty uses separate inserts
+    INGEST_RPC = os.getenv("INGEST_RPC", "")
+
+    # Notifications: buyers pick "instant" or "digest" via preferences.notification_mode
+    NOTIFY_MODE_DEFAULT = os.getenv("NOTIFY_MODE_DEFAULT", "instant")
+    DIGEST_WINDOW_SECONDS = float(os.getenv("DIGEST_WINDOW_SECONDS", "900"))
+    DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", "10"))
+
+    # Buyer bot: conversation sessions are in memory and expire after BOT_SESSION_TTL seconds
+    BOT_SESSION_TTL = float(os.getenv("BOT_SESSION_TTL", "1800"))
+    BOT_SESSION_MAX = int(os.getenv("BOT_SESSION_MAX", "10000"))
+    # Shared secrets: the bot webhook's secret_token (setWebhook) and the X-API-Key
+    # for /preferences; either endpoint refuses every request while its secret is unset
+    BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")
+    PREFERENCES_API_KEY = os.getenv("PREFERENCES_API_KEY", "")
+
+    # Admission control for /process-listing and /trigger-matching
+    ADMISSION_LIMIT = int(os.getenv("ADMISSION_LIMIT", "8"))
+    ADMISSION_LIVE_QUEUE = int(os.getenv("ADMISSION_LIVE_QUEUE", "100"))
+    ADMISSION_BACKFILL_QUEUE = int(os.getenv("ADMISSION_BACKFILL_QUEUE", "50"))
+    ADMISSION_DEADLINE = float(os.getenv("ADMISSION_DEADLINE", "10"))
+
+    # Market statistics: per make/model/year price sketches, checkpointed to disk
+    MARKET_STATS_PATH = os.getenv("MARKET_STATS_PATH", "market_stats.json")
+    MARKET_STATS_INTERVAL = float(os.getenv("MARKET_STATS_INTERVAL", "300"))
+    MARKET_STATS_WINDOWS = os.getenv("MARKET_STATS_WINDOWS", "7,30")
+    MARKET_STATS_ACCURACY = float(os.getenv("MARKET_STATS_ACCURACY", "0.01"))
+
+    # Leader election: only the worker holding the lock runs the Telegram monitor
+    LEADER_LOCK_FILE = os.getenv("LEADER_LOCK_FILE", "telegram_monitor.lock")
+    LEADER_POLL_INTERVAL = float(os.getenv("LEADER_POLL_INTERVAL", "5"))
+    LEADER_DB_LEASE = os.getenv("LEADER_DB_LEASE", "false").lower() == "true"
+    LEADER_LEASE_TTL = int(os.getenv("LEADER_LEASE_TTL", "30"))
+
+    # Read-through cache for GET /matches, /listings and /test-listing-query.
+    # Invalidation is per worker; other workers serve their copy until the TTL
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+    RESPONSE_CACHE_MATCHES_TTL = float(os.getenv("RESPONSE_CACHE_MATCHES_TTL", "2"))
+
+    # Startup: shared Supabase HTTP pool size and per-stage timeout in seconds
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+    STARTUP_STAGE_TIMEOUT = float(os.getenv("STARTUP_STAGE_TIMEOUT", "60"))
+
+    # Media: content-addressed photo store and downloader limits
+    MEDIA_DIR = os.getenv("MEDIA_DIR", "media")
+    MEDIA_CONCURRENCY = int(os.getenv("MEDIA_CONCURRENCY", "4"))
+    MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", "200"))
+    MEDIA_PHASH_DISTANCE = int(os.getenv("MEDIA_PHASH_DISTANCE", "6"))
+    # Most recently seen photos kept in the in-memory repost index
+    MEDIA_INDEX_MAX = int(os.getenv("MEDIA_INDEX_MAX", "50000"))
     
     @classmethod
     def validate(cls):
@@ -25,6 +95,3 @@ class Config:
         
         if missing:
             raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
-
-# Validate on import
-Config.validate()
\ No newline at end of file
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from itertools import count
+
+import httpx
+
+# Add your app directory to path
+sys.path.append(os.path.dirname(__file__))
+
+# The stand-ins below answer every request, but the URLs still have to parse
+os.environ.setdefault("SUPABASE_URL", "http://supabase.replay")
+os.environ.setdefault("SUPABASE_KEY", "replay")
+os.environ.setdefault("API_ID", "0")
+# Never warm-start from, or checkpoint into, the production snapshot and stats files
+os.environ["BUYER_SNAPSHOT_PATH"] = ""
+os.environ["MARKET_STATS_PATH"] = ""
+
+from app.services.matching_service import matching_service
+from app.services.telegram_monitor import TelegramMonitor
+
+MAKES = {
+    "toyota": ["camry", "corolla", "hilux", "prado", "land cruiser"],
+    "honda": ["accord", "civic", "cr-v"],
+    "nissan": ["patrol", "altima", "x-trail"],
+    "bmw": ["x5", "320i", "530i"],
+    "mercedes": ["c200", "e300", "gle"],
+}
+
+
+class Timings:
+    """Collects durations per stage name"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class FakeSupabase:
+    """In-memory stand-in for the PostgREST API, served through httpx.MockTransport.
+
+    Supports the subset the service uses: eq./in./gt. filters, limit, and
+    POST/PATCH/DELETE returning the affected rows. ``latency`` seconds are
+    added to every call to model the network round trip.
+    """
+
+    def __init__(self, timings, latency=0.0):
+        self.timings = timings
+        self.latency = latency
+        self.tables = defaultdict(list)
+        self._ids = count(1)
+
+    @staticmethod
+    def _matches(row, params):
+        for key, condition in params.items():
+            if key in ("select", "order", "limit", "offset"):
+                continue
+            op, _, value = condition.partition(".")
+            actual = row.get(key)
+            if op == "eq" and str(actual).lower() != value.lower():
+                return False
+            if op == "in" and str(actual) not in value.strip("()").split(","):
+                return False
+            if op == "gt" and not (actual is not None and str(actual) > value):
+                return False
+        return True
+
+    def _insert(self, table, items):
+        rows = []
+        for item in items:
+            row = {"id": next(self._ids), **item}
+            self.tables[table].append(row)
+            rows.append(row)
+        return rows
+
+    def _ingest(self, payload):
+        """Same contract as the ingest_listing function documented in MatchingService"""
+        listing = self._insert("listings", [payload["listing"]])[0]
+        matches = self._insert("matches", [{**m, "listing_id": listing["id"]} for m in payload["matches"]])
+        return {"listing": listing, "matches": matches}
+
+    async def __call__(self, request):
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency)
+
+        table = request.url.path.rsplit("/", 1)[-1]
+        if "/rpc/" in request.url.path:
+            result = self._ingest(json.loads(request.content))
+            self.timings.add(f"supabase RPC {table}", time.perf_counter() - started)
+            return httpx.Response(200, json=result)
+
+        params = dict(request.url.params)
+        rows = self.tables[table]
+        selected = [row for row in rows if self._matches(row, params)]
+
+        if request.method == "GET":
+            if "limit" in params:
+                selected = selected[:int(params["limit"])]
+            result = selected
+        elif request.method == "POST":
+            data = json.loads(request.content)
+            result = self._insert(table, data if isinstance(data, list) else [data])
+        elif request.method == "PATCH":
+            changes = json.loads(request.content)
+            for row in selected:
+                row.update(changes)
+            result = selected
+        elif request.method == "DELETE":
+            self.tables[table] = [row for row in rows if row not in selected]
+            result = selected
+        else:
+            return httpx.Response(405)
+
+        self.timings.add(f"supabase {request.method} {table}", time.perf_counter() - started)
+        return httpx.Response(200, json=result)
+
+
+def extract_listing(message):
+    """Stand-in for the n8n extraction step: pull make, model, price and year from text"""
+    text = message["raw_text"].lower()
+
+    make = next((m for m in MAKES if m in text), None)
+    if not make:
+        return None
+    model = next((m for m in MAKES[make] if m in text), None)
+    year_match = re.search(r"\b(19[89]\d|20[0-3]\d)\b", text)
+    year = int(year_match.group(1)) if year_match else None
+
+    prices = []
+    for amount, suffix in re.findall(r"(\d[\d,\.]*)\s*(k\b)?", text):
+        try:
+            value = float(amount.replace(",", "")) * (1000 if suffix else 1)
+        except ValueError:
+            continue
+        if value >= 1000 and value != year:
+            prices.append(value)
+
+    return {
+        "category": "vehicles",
+        "product_data": {
+            "make": make,
+            "model": model or "",
+            "price": max(prices) if prices else 0,
+            "year": year,
+        },
+        "telegram_sender_id": message.get("sender_id"),
+        "telegram_message_id": message.get("message_id"),
+        "seller_name": message.get("sender_name", ""),
+    }
+
+
+def load_messages(path):
+    """Read webhook-format payloads, or backlog-format lines with their body as the text"""
+    messages = []
+    with open(path) as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "raw_text" not in record:
+                record = {
+                    "raw_text": f"{record.get('title', '')}\n{record.get('body', '')}",
+                    "message_id": index + 1,
+                    "sender_id": 0,
+                    "sender_name": record.get("request_id", "replay"),
+                }
+            record.setdefault("message_id", index + 1)
+            messages.append(record)
+    return messages
+
+
+def synthetic_buyers(n, seed):
+    rng = random.Random(seed)
+    buyers = []
+    for i in range(n):
+        make = rng.choice(list(MAKES))
+        low = rng.randrange(5000, 60000, 1000)
+        buyers.append({
+            "id": f"buyer-{i}",
+            "name": f"Buyer {i}",
+            "cell_number": f"+000{i:07d}",
+            "chat_id": 1_000_000 + i,
+            "preferences": {
+                "make": [make],
+                "model": rng.sample(MAKES[make], rng.randint(0, 2)),
+                "min_price": low,
+                "max_price": low + rng.randrange(5000, 80000, 1000),
+                "min_year": rng.choice([None, 2012, 2016, 2019]),
+            },
+        })
+    return buyers
+
+
+def schedule(messages, speed, rate):
+    """Seconds after start at which each message is replayed"""
+    if rate:
+        return [i / rate for i in range(len(messages))]
+    stamps = [m.get("timestamp") for m in messages]
+    if not all(isinstance(s, (int, float)) for s in stamps):
+        print("⚠️ Messages have no timestamps, replaying at 1 message/second")
+        return [float(i) for i in range(len(messages))]
+    first = min(stamps)
+    return [(s - first) / speed for s in stamps]
+
+
+async def replay_one(message, due, start, timings, n8n_latency, counters):
+    await asyncio.sleep(max(0.0, start + due - time.perf_counter()))
+    scheduled = start + due
+
+    t = time.perf_counter()
+    message["extracted_data"] = TelegramMonitor._extract_product_data(message["raw_text"])
+    timings.add("extract", time.perf_counter() - t)
+
+    # Delivery hop to n8n: serialize the webhook payload and pay its round trip
+    t = time.perf_counter()
+    payload = json.loads(json.dumps(message, default=str))
+    await asyncio.sleep(n8n_latency)
+    listing_data = extract_listing(payload)
+    timings.add("deliver", time.perf_counter() - t)
+
+    if listing_data is None:
+        counters["filtered"] += 1
+        return
+
+    t = time.perf_counter()
+    result = await matching_service.process_listing_and_match(listing_data)
+    timings.add("process_listing_and_match", time.perf_counter() - t)
+    for stage, ms in (result.get("timings_ms") or {}).items():
+        timings.add(f"  {stage}", ms / 1000)
+
+    if result.get("success"):
+        counters["listings"] += 1
+        counters["matches"] += result.get("match_count", 0)
+    else:
+        counters["errors"] += 1
+    timings.add("end_to_end", time.perf_counter() - scheduled)
+
+
+def report(timings, counters, elapsed, total):
+    print("\n📊 Replay report")
+    print(f"   Messages: {total} | listings: {counters['listings']} | filtered: {counters['filtered']} "
+          f"| errors: {counters['errors']} | matches: {counters['matches']}")
+    print(f"   Wall time: {elapsed:.2f}s | throughput: {total / elapsed if elapsed else 0:.1f} msg/s")
+    print(f"\n   {'stage':<34}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}")
+    for stage, values in timings.samples.items():
+        row = [Timings.percentile(values, p) * 1000 for p in (50, 90, 99)]
+        print(f"   {stage:<34}{len(values):>7}" + "".join(f"{v:>10.1f}" for v in row)
+              + f"{max(values) * 1000:>10.1f}{sum(values):>10.2f}")
+
+
+async def main(args):
+    messages = load_messages(args.input)
+    if args.limit:
+        messages = messages[:args.limit]
+
+    timings = Timings()
+    supabase = FakeSupabase(timings, latency=args.supabase_latency / 1000)
+    if args.buyers_file:
+        with open(args.buyers_file) as f:
+            supabase.tables["buyers"] = json.load(f)
+    else:
+        supabase.tables["buyers"] = synthetic_buyers(args.buyers, args.seed)
+
+    matching_service.ingest_rpc = args.ingest_rpc
+    matching_service._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(supabase), base_url=matching_service.base_url
+    )
+    await matching_service.warm_up()
+
+    offsets = schedule(messages, args.speed, args.rate)
+    counters = defaultdict(int)
+    print(f"▶️ Replaying {len(messages)} messages against {len(supabase.tables['buyers'])} buyers "
+          f"({'%.1f msg/s' % args.rate if args.rate else '%sx real time' % args.speed})")
+
+    # The service's debug prints would dominate the timings, so they are muted unless asked for
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with output:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            replay_one(message, due, start, timings, args.n8n_latency / 1000, counters)
+            for message, due in zip(messages, offsets)
+        ])
+        elapsed = time.perf_counter() - start
+
+    report(timings, counters, elapsed, len(messages))
+    matching_service.match_executor.close()
+    await matching_service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded seller messages through the matching pipeline")
+    parser.add_argument("input", help="JSONL of /test-telegram-webhook payloads or backlog-style records")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiple of real time between recorded timestamps")
+    parser.add_argument("--rate", type=float, default=None, help="fixed messages per second (overrides --speed)")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N messages")
+    parser.add_argument("--buyers", type=int, default=1000, help="number of synthetic buyers")
+    parser.add_argument("--buyers-file", help="JSON array of buyer rows to use instead of synthetic buyers")
+    parser.add_argument("--supabase-latency", type=float, default=20.0, help="simulated Supabase round trip in ms")
+    parser.add_argument("--n8n-latency", type=float, default=50.0, help="simulated n8n webhook round trip in ms")
+    parser.add_argument("--ingest-rpc", default="", help="store listings and matches through this RPC name")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the service's own logging during the replay")
+    asyncio.run(main(parser.parse_args()))
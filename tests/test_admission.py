@@ -0,0 +1,101 @@
+import asyncio
+
+from app.services.admission import AdmissionController, AdmissionRejected, BACKFILL, LIVE
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_slots_are_reused_without_leaking():
+    async def scenario():
+        admission = AdmissionController(limit=2, queue_sizes={LIVE: 10, BACKFILL: 10}, deadline=1.0)
+
+        async def job():
+            await admission.acquire(LIVE)
+            await asyncio.sleep(0.01)
+            admission.release(0.01)
+
+        await asyncio.gather(*[job() for _ in range(8)])
+        return admission.stats()
+
+    stats = _run(scenario())
+    assert stats["active"] == 0
+    assert stats["lanes"][LIVE]["admitted"] == 8
+    assert stats["lanes"][LIVE]["queued"] == 0
+
+
+def test_live_lane_goes_first():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_sizes={LIVE: 5, BACKFILL: 5}, deadline=1.0)
+        order = []
+        await admission.acquire(LIVE)
+
+        async def job(lane, name):
+            await admission.acquire(lane)
+            order.append(name)
+            admission.release(0.0)
+
+        backfill = asyncio.create_task(job(BACKFILL, "backfill"))
+        await asyncio.sleep(0)
+        live = asyncio.create_task(job(LIVE, "live"))
+        await asyncio.sleep(0)
+        admission.release(0.0)
+        await asyncio.gather(backfill, live)
+        return order, admission.active
+
+    order, active = _run(scenario())
+    assert order == ["live", "backfill"]
+    assert active == 0
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_sizes={LIVE: 1, BACKFILL: 0}, deadline=1.0)
+        await admission.acquire(LIVE)
+        waiting = asyncio.create_task(admission.acquire(LIVE))
+        await asyncio.sleep(0)
+        errors = []
+        for lane in (LIVE, BACKFILL):
+            try:
+                await admission.acquire(lane)
+            except AdmissionRejected as e:
+                errors.append(e)
+        admission.release(0.0)
+        await waiting
+        admission.release(0.0)
+        return errors, admission.stats()
+
+    errors, stats = _run(scenario())
+    assert len(errors) == 2 and all(e.retry_after >= 1 for e in errors)
+    assert stats["active"] == 0
+    assert stats["lanes"][LIVE]["rejected_full"] == 1
+    assert stats["lanes"][BACKFILL]["rejected_full"] == 1
+
+
+def test_deadline_and_cancel_release_their_place():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_sizes={LIVE: 5, BACKFILL: 5}, deadline=0.05)
+        await admission.acquire(LIVE)
+
+        try:
+            await admission.acquire(LIVE)
+        except AdmissionRejected:
+            pass
+
+        cancelled = asyncio.create_task(admission.acquire(BACKFILL))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        try:
+            await cancelled
+        except asyncio.CancelledError:
+            pass
+
+        admission.release(0.0)
+        return admission.stats()
+
+    stats = _run(scenario())
+    assert stats["active"] == 0
+    assert stats["lanes"][LIVE]["rejected_deadline"] == 1
+    assert stats["lanes"][LIVE]["queued"] == 0
+    assert stats["lanes"][BACKFILL]["queued"] == 0
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+
+from app.services.bot_sessions import SessionStore
+from app.services.buyer_bot import BuyerBot, describe_preferences, parse_price_range
+from app.services.preference_cache import PreferenceCache
+from app.services.preferences_service import PreferencesService
+
+
+class FakeMatching:
+    """Just enough of MatchingService for PreferencesService: a buyers table and the live index"""
+
+    def __init__(self):
+        self.buyers = []
+        self.preference_cache = PreferenceCache(watermark_column="")
+        self.preference_cache.load([])
+
+    def _find(self, params):
+        value = (params.get("chat_id") or params.get("id")).split(".", 1)[1]
+        key = "chat_id" if "chat_id" in params else "id"
+        return [buyer for buyer in self.buyers if str(buyer[key]) == value]
+
+    async def _get(self, table, params):
+        return self._find(params)
+
+    async def _insert(self, table, row):
+        buyer = {"id": len(self.buyers) + 1, **row}
+        self.buyers.append(buyer)
+        return [buyer]
+
+    async def _update(self, table, params, changes):
+        rows = self._find(params)
+        for buyer in rows:
+            buyer.update(changes)
+        return rows
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("10000-20000", (10000, 20000)),
+    ("20k to 10k", (10000, 20000)),
+    ("1.5m - 2m", (1_500_000, 2_000_000)),
+    ("under 15,000", (None, 15000)),
+    ("from 8000", (8000, None)),
+    ("5000+", (5000, None)),
+    ("Any", (None, None)),
+])
+def test_parse_price_range(text, expected):
+    assert parse_price_range(text) == expected
+
+
+@pytest.mark.parametrize("text", ["cheap", "15000", "1-2-3"])
+def test_parse_price_range_rejects(text):
+    with pytest.raises(ValueError):
+        parse_price_range(text)
+
+
+def _update(chat_id, text=None, contact=None, user_id=None):
+    message = {"chat": {"id": chat_id}, "from": {"id": user_id or chat_id, "first_name": "Tendai"}}
+    if text is not None:
+        message["text"] = text
+    if contact is not None:
+        message["contact"] = contact
+    return {"message": message}
+
+
+def _converse(bot, chat_id, *steps):
+    async def run():
+        replies = []
+        for step in steps:
+            update = step if isinstance(step, dict) else _update(chat_id, step)
+            replies.extend(await bot.handle(update))
+        return replies
+    return asyncio.run(run())
+
+
+def _bot():
+    matching = FakeMatching()
+    return BuyerBot(PreferencesService(matching), SessionStore(ttl=60, max_sessions=10)), matching
+
+
+def test_registration_edit_and_unsubscribe():
+    bot, matching = _bot()
+    contact = {"phone_number": "+263771234567", "user_id": 42}
+
+    replies = _converse(
+        bot, 42,
+        "/register", "Tendai Moyo", _update(42, contact=contact), "🚗 Vehicles",
+        "Toyota, Honda", "Any", "10k-20k", "2015", "📬 Digest",
+    )
+    assert "all set" in replies[-1]["message"]
+    buyer = matching.buyers[0]
+    assert buyer["name"] == "Tendai Moyo"
+    assert buyer["cell_number"] == "+263771234567"
+    assert buyer["preferences"] == {
+        "product_type": "vehicles", "make": ["toyota", "honda"], "min_price": 10000.0,
+        "max_price": 20000.0, "min_year": 2015, "notification_mode": "digest",
+    }
+    # Written through to the live index, not just the table
+    assert matching.preference_cache.compiled.get_buyer(buyer["id"]) is not None
+
+    replies = _converse(bot, 42, "/edit", "Price range", "under 12000", "✅ Done")
+    assert buyer["preferences"]["max_price"] == 12000.0
+    assert "min_price" not in buyer["preferences"]
+    assert "Preferences saved" in replies[-1]["message"]
+
+    _converse(bot, 42, "/unsubscribe", "Yes, unsubscribe")
+    assert buyer["preferences"]["unsubscribed"] is True
+    assert matching.preference_cache.compiled.get_buyer(buyer["id"]) is None
+
+
+def test_bad_answer_keeps_the_step():
+    bot, matching = _bot()
+    replies = _converse(
+        bot, 7,
+        "/register", "Rudo", _update(7, contact={"phone_number": "+1", "user_id": 7}), "Vehicles",
+        "Any", "whenever",
+    )
+    assert replies[-1]["message"].startswith("⚠️")
+    assert bot.sessions.get(7).step == "awaiting_price"
+    assert matching.buyers == []
+
+
+def test_commands_need_registration():
+    bot, _ = _bot()
+    replies = _converse(bot, 9, "/edit")
+    assert "not registered" in replies[0]["message"]
+    assert bot.sessions.get(9) is None
+
+
+def test_describe_preferences_handles_any_and_ranges():
+    text = describe_preferences({"name": "A", "cell_number": "1", "preferences": {"max_price": 5000}})
+    assert "Makes: Any" in text
+    assert "up to 5,000" in text
+
+
+def test_forwarded_contact_is_not_verified():
+    bot, matching = _bot()
+    forwarded = {"phone_number": "+263770000000", "user_id": 99}
+    replies = _converse(bot, 42, "/register", "Tendai Moyo", _update(42, contact=forwarded))
+    assert replies[-1]["message"].startswith("⚠️")
+    assert bot.sessions.get(42).step == "awaiting_contact"
+
+    # A shared contact card without a user id proves nothing either
+    replies = _converse(bot, 42, _update(42, contact={"phone_number": "+263770000000"}))
+    assert bot.sessions.get(42).step == "awaiting_contact"
+    assert matching.buyers == []
+
+
+def test_describe_preferences_accepts_string_prices():
+    text = describe_preferences({"preferences": {"min_price": "10000", "max_price": "25000.5"}})
+    assert "10,000 - 25,000" in text
+
+
+def test_edit_of_a_buyer_with_string_prices():
+    matching = FakeMatching()
+    matching.buyers.append({
+        "id": 1, "chat_id": 5, "name": "Old", "cell_number": "1",
+        "preferences": {"min_price": "9000", "max_price": "25000", "min_year": 2012},
+    })
+    service = PreferencesService(matching)
+
+    # "9000" > "25000" as text, so the stored strings must be compared as numbers
+    buyer = asyncio.run(service.update_preferences(5, {"min_year": 2015}))
+    assert buyer["preferences"] == {"min_price": 9000.0, "max_price": 25000.0, "min_year": 2015}
+
+    buyer = asyncio.run(service.update_preferences(5, {"max_price": 20000}))
+    assert buyer["preferences"]["max_price"] == 20000.0
+
+    with pytest.raises(ValueError):
+        asyncio.run(service.update_preferences(5, {"min_price": "30000"}))
@@ -0,0 +1,56 @@
+from app.services import buyer_snapshot
+from app.services.preference_cache import CompiledBuyers
+
+
+def _compiled():
+    compiled = CompiledBuyers(4)
+    compiled.add({"id": "a", "updated_at": "2024-01-02", "preferences": {"make": ["toyota"], "max_price": 20000}})
+    compiled.add({"id": "b", "updated_at": "2024-01-05", "preferences": {"make": ["honda"], "model": ["civic"],
+                                                                        "min_price": 5000, "min_year": 2015}})
+    compiled.add({"id": "c", "updated_at": "2024-01-03", "preferences": {}})
+    return compiled
+
+
+def _write(compiled, path):
+    buyer_snapshot.write_snapshot(compiled, buyer_snapshot.capture(compiled), path)
+    return buyer_snapshot.load_snapshot(path)
+
+
+def test_snapshot_round_trip(tmp_path):
+    compiled = _compiled()
+    loaded = _write(compiled, str(tmp_path / "buyers.snapshot"))
+
+    assert loaded.generation == 4
+    assert loaded.watermark == "2024-01-05"
+    assert loaded.vocab == compiled.vocab
+    assert loaded.row_by_id == compiled.row_by_id
+    assert list(loaded.buyers) == compiled.buyers
+    for name, column in compiled.columns().items():
+        assert list(loaded.columns()[name]) == list(column)
+    assert loaded.written_at > 0
+
+
+def test_loaded_snapshot_accepts_upserts(tmp_path):
+    path = str(tmp_path / "buyers.snapshot")
+    loaded = _write(_compiled(), path)
+
+    loaded.upsert({"id": "a", "updated_at": "2024-02-01", "preferences": {"make": ["bmw"]}})
+    listing = {"product_data": {"make": "bmw", "model": "x5", "price": 30000}}
+    encoded = loaded.encode_listing(listing)
+    assert encoded[0] == loaded.vocab["bmw"]
+    assert loaded.watermark == "2024-02-01"
+
+    # A snapshot of the edited index loads the same rows back
+    again = _write(loaded, str(tmp_path / "again.snapshot"))
+    assert again.get_buyer("a")["preferences"] == {"make": ["bmw"]}
+    assert list(again.min_price) == list(loaded.min_price)
+
+
+def test_snapshot_rejects_other_formats(tmp_path):
+    path = tmp_path / "buyers.snapshot"
+    path.write_bytes(b"\0" * 64)
+    try:
+        buyer_snapshot.load_snapshot(str(path))
+    except ValueError:
+        return
+    raise AssertionError("load_snapshot should reject an unknown file")
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import digest_service
+from app.services.digest_service import DigestService, DIGEST, INSTANT
+
+
+def _row(match_id, minutes_ago, price=10000):
+    matched_at = (datetime.utcnow() - timedelta(minutes=minutes_ago)).isoformat()
+    return {"id": match_id, "matched_at": matched_at, "product_data": {"make": "toyota", "price": price}}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    messages = []
+
+    async def send(chat_id, text, keyboard=None):
+        messages.append((chat_id, text))
+        return True
+
+    monkeypatch.setattr(digest_service, "send_telegram_message", send)
+    return messages
+
+
+def _service(pending, notified, window=600, max_items=3):
+    async def fetch_pending():
+        return [pair for pair in pending if pair[1]["id"] not in notified]
+
+    async def mark_notified(match_ids):
+        notified.update(match_ids)
+
+    return DigestService(fetch_pending, mark_notified, window=window, max_items=max_items)
+
+
+BUYER = {"id": "a", "chat_id": 1, "preferences": {"notification_mode": DIGEST}}
+OTHER = {"id": "b", "chat_id": 2, "preferences": {"notification_mode": DIGEST}}
+
+
+def test_digest_waits_for_its_window(sent):
+    notified = set()
+    pending = [(BUYER, _row(1, 5)), (BUYER, _row(2, 1))]
+    service = _service(pending, notified)
+
+    assert asyncio.run(service.flush_due()) == 0
+    assert sent == []
+
+    pending.append((OTHER, _row(3, 11)))
+    assert asyncio.run(service.flush_due()) == 1
+    assert [chat_id for chat_id, _ in sent] == [2]
+    assert notified == {3}
+
+
+def test_digest_sends_early_at_max_items(sent):
+    notified = set()
+    pending = [(BUYER, _row(i, 1)) for i in range(1, 8)]
+    service = _service(pending, notified, max_items=3)
+
+    # Due by count: every pending row goes out, max_items per message, oldest first
+    assert asyncio.run(service.flush_due()) == 7
+    assert len(sent) == 3
+    assert sent[0][1].startswith("🚗 3 new matches")
+    assert notified == set(range(1, 8))
+    assert asyncio.run(service.flush_due()) == 0
+
+
+def test_force_and_failed_delivery(monkeypatch):
+    notified = set()
+    service = _service([(BUYER, _row(1, 1))], notified)
+
+    async def fail(chat_id, text, keyboard=None):
+        return False
+
+    monkeypatch.setattr(digest_service, "send_telegram_message", fail)
+    assert asyncio.run(service.flush_due(force=True)) == 0
+    # Undelivered rows stay unnotified for the next poll
+    assert notified == set()
+    assert service.stats()["pending_matches"] == 1
+
+
+def test_mode_for():
+    service = _service([], set())
+    assert service.mode_for(BUYER) == DIGEST
+    assert service.mode_for({"id": "c", "chat_id": None, "preferences": {"notification_mode": DIGEST}}) == INSTANT
+    assert service.mode_for(None) == INSTANT
+    assert service.mode_for({"id": "d", "chat_id": 3, "preferences": {}}) == INSTANT
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from app.services.leader_election import LeaderElection
+
+
+def test_leader_steps_down_before_lease_expires(tmp_path):
+    election = LeaderElection(str(tmp_path / "leader.lock"), poll_interval=0.05, use_db_lease=True, lease_ttl=0.6)
+    renewals = []
+    events = []
+
+    async def lease(timeout=10.0):
+        # First call succeeds, every renewal after it hangs until the timeout and fails
+        renewals.append(time.monotonic())
+        if len(renewals) == 1:
+            return True
+        await asyncio.sleep(timeout)
+        return None
+
+    async def elected():
+        events.append(("elected", time.monotonic()))
+
+    async def demoted():
+        events.append(("demoted", time.monotonic()))
+
+    election._try_db_lease = lease
+    election._release_db_lease = lambda: asyncio.sleep(0)
+
+    async def run():
+        await election.start(elected, demoted)
+        await asyncio.sleep(0.7)
+        await election.stop()
+
+    asyncio.run(run())
+    assert [name for name, _ in events[:2]] == ["elected", "demoted"]
+    # The database lease was taken no earlier than the first call was sent
+    held_for = events[1][1] - renewals[0]
+    assert 0.35 <= held_for <= 0.45
+
+
+def test_failed_renewal_keeps_leadership_within_deadline(tmp_path):
+    election = LeaderElection(str(tmp_path / "leader.lock"), use_db_lease=True, lease_ttl=30)
+    results = iter([True, None])
+
+    async def lease(timeout=10.0):
+        return next(results)
+
+    election._try_db_lease = lease
+
+    async def run():
+        assert await election._try_acquire()
+        election.is_leader = True
+        return await election._try_acquire()
+
+    assert asyncio.run(run())
+    election._release_file_lock()
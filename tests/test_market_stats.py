@@ -0,0 +1,106 @@
+import random
+
+from app.services.market_stats import MarketStats, QuantileSketch, DAY
+
+
+def _exact(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(9, 0.8) for _ in range(5000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        exact = _exact(values, q)
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact + 1e-9
+
+
+def test_sketch_merge_equals_single_sketch():
+    rng = random.Random(3)
+    values = [rng.uniform(1000, 90000) for _ in range(2000)]
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (left if index % 2 else right).add(value)
+
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.bins == whole.bins
+
+
+def test_sketch_merge_rejects_other_accuracy():
+    sketch = QuantileSketch(0.01)
+    try:
+        sketch.merge(QuantileSketch(0.02))
+    except ValueError:
+        return
+    raise AssertionError("merge should reject sketches with another accuracy")
+
+
+def test_sketch_round_trip_and_empty():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    for value in (0, 10, 20, 30):
+        sketch.add(value)
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    assert restored.count == 4
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+    assert restored.quantile(0.0) == 0.0
+
+
+def _listing(price, make="toyota", model="camry", year=2018):
+    return {"product_data": {"make": make, "model": model, "year": year, "price": price}}
+
+
+def test_checkpoint_merges_workers(tmp_path):
+    path = str(tmp_path / "market_stats.json")
+    now = 100 * DAY
+    first, second = MarketStats(path), MarketStats(path)
+
+    for price in (10000, 12000, 14000):
+        assert first.record(_listing(price), now=now)
+    for price in (16000, 18000):
+        assert second.record(_listing(price), now=now)
+    assert not second.record(_listing("call me"), now=now)
+
+    first.adopt(first.write_checkpoint(first.take_delta(), now=now), now=now)
+    second.adopt(second.write_checkpoint(second.take_delta(), now=now), now=now)
+
+    # The second checkpoint saw the first, the first catches up on reload
+    assert second.query("Toyota", now=now)["all_time"]["count"] == 5
+    assert first.query("toyota", now=now)["all_time"]["count"] == 3
+    first.load()
+    summary = first.query("toyota", "camry", 2018, now=now)["all_time"]
+    assert summary["count"] == 5
+    assert summary["min"] == 10000 and summary["max"] == 18000
+    assert abs(summary["quantiles"]["p50"] - 14000) <= 140
+
+
+def test_failed_checkpoint_delta_is_kept(tmp_path):
+    stats = MarketStats(str(tmp_path / "market_stats.json"))
+    now = 100 * DAY
+    stats.record(_listing(20000), now=now)
+
+    delta = stats.take_delta()
+    stats.restore_delta(delta)
+    stats.adopt(stats.write_checkpoint(stats.take_delta(), now=now), now=now)
+
+    reloaded = MarketStats(stats.path)
+    reloaded.load()
+    assert reloaded.query("toyota", now=now)["all_time"]["count"] == 1
+
+
+def test_windows_drop_old_days(tmp_path):
+    stats = MarketStats(str(tmp_path / "market_stats.json"), windows_days=[7])
+    today = 100 * DAY
+    stats.record(_listing(10000), now=today - 10 * DAY)
+    stats.record(_listing(20000), now=today)
+
+    result = stats.query("toyota", now=today)
+    assert result["all_time"]["count"] == 2
+    assert result["windows"]["7d"]["count"] == 1
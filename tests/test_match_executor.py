@@ -0,0 +1,123 @@
+import asyncio
+import random
+from multiprocessing import shared_memory
+
+import pytest
+
+from app.services.match_executor import MatchExecutor
+from app.services.preference_cache import CompiledBuyers, PreferenceCache
+
+MAKES = {"toyota": ["camry", "corolla"], "honda": ["civic", "accord"], "bmw": ["x5", "320i"]}
+
+
+def _compiled(generation, seed, count=500):
+    rng = random.Random(seed)
+    compiled = CompiledBuyers(generation)
+    for buyer_id in range(count):
+        make = rng.choice(list(MAKES))
+        low = rng.randrange(0, 40000, 1000)
+        compiled.add({"id": buyer_id, "preferences": {
+            "make": rng.choice([[], [make]]),
+            "model": rng.sample(MAKES[make], rng.randint(0, 1)),
+            "min_price": low,
+            "max_price": low + rng.randrange(5000, 40000, 1000),
+            "min_year": rng.choice([None, 2012, 2018]),
+        }})
+    return compiled
+
+
+def _listings(seed, count=40):
+    rng = random.Random(seed)
+    listings = []
+    for _ in range(count):
+        make = rng.choice(list(MAKES))
+        listings.append({"product_data": {
+            "make": make, "model": rng.choice(MAKES[make]),
+            "price": rng.randrange(1000, 70000, 500), "year": rng.choice([None, 2010, 2016, 2022]),
+        }})
+    return listings
+
+
+@pytest.fixture
+def sharded():
+    executor = MatchExecutor(workers=2)
+    yield executor
+    executor.close()
+
+
+def _ids(buyers):
+    return sorted(buyer["id"] for buyer in buyers)
+
+
+def test_sharded_matches_equal_in_process(sharded):
+    compiled = _compiled(1, seed=4)
+    listings = _listings(seed=8)
+    in_process = MatchExecutor(workers=0)
+
+    async def run():
+        # Submitted together so they go out as one batch per shard
+        sharded_results = await asyncio.gather(*[sharded.match(compiled, listing) for listing in listings])
+        local_results = [await in_process.match(compiled, listing) for listing in listings]
+        return sharded_results, local_results
+
+    sharded_results, local_results = asyncio.run(run())
+    assert [_ids(r) for r in sharded_results] == [_ids(r) for r in local_results]
+    assert any(local_results)
+
+
+def test_old_generations_are_released(sharded):
+    listing = _listings(seed=1, count=1)[0]
+    published = []
+
+    async def run():
+        for generation in (1, 2, 3):
+            compiled = _compiled(generation, seed=generation)
+            await sharded.match(compiled, listing)
+            published.append([name for name, _, _ in sharded._current.spec["columns"].values()])
+
+    asyncio.run(run())
+    # The previous generation stays mapped for in-flight batches, older ones are unlinked
+    for name in published[0]:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+    block = shared_memory.SharedMemory(name=published[1][0])
+    block.close()
+
+    sharded.close()
+    for names in published[1:]:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=names[0])
+
+
+def test_write_throughs_reuse_the_published_copy():
+    cache = PreferenceCache(watermark_column="")
+    cache.install(_compiled(1, seed=6))
+    listings = _listings(seed=9)
+    sharded = MatchExecutor(workers=2, max_tail=3)
+    in_process = MatchExecutor(workers=0)
+
+    async def matched(executor):
+        return [_ids(await executor.match(cache.compiled, listing)) for listing in listings]
+
+    async def run():
+        assert any(0 in ids for ids in await matched(sharded))
+        published = sharded._current
+        # One unsubscribe, one edit and one new buyer who accepts anything
+        cache.write_through({"id": 0, "preferences": {"unsubscribed": True}})
+        cache.write_through({"id": 1, "preferences": {"make": ["honda"], "max_price": 90000}})
+        cache.write_through({"id": 900, "preferences": {}})
+        results = await matched(sharded)
+        assert sharded._current is published
+        assert results == await matched(in_process)
+        assert all(900 in ids for ids in results)
+        assert not any(0 in ids for ids in results)
+
+        for buyer_id in (901, 902):
+            cache.write_through({"id": buyer_id, "preferences": {}})
+        await matched(sharded)
+        assert sharded._current is not published
+
+    try:
+        asyncio.run(run())
+    finally:
+        sharded.close()
@@ -0,0 +1,70 @@
+import random
+
+from app.services.match_scoring import MatchScorer, parse_weights
+from app.services.matching_service import MatchingService
+
+
+LISTING = {"product_data": {"make": "toyota", "model": "camry", "price": 15000, "year": 2019}}
+
+
+def _buyer(buyer_id, min_price=0, max_price=None, min_year=None, models=None):
+    preferences = {"make": ["toyota"], "min_price": min_price}
+    if max_price is not None:
+        preferences["max_price"] = max_price
+    if min_year is not None:
+        preferences["min_year"] = min_year
+    if models is not None:
+        preferences["model"] = models
+    return {"id": buyer_id, "preferences": preferences}
+
+
+def test_top_k_matches_full_sort():
+    rng = random.Random(2)
+    scorer = MatchScorer()
+    buyers = [
+        _buyer(i, rng.randrange(0, 15000, 500), rng.randrange(15000, 60000, 500),
+               rng.choice([None, 2010, 2015, 2018]), rng.choice([None, ["camry"], ["camry", "corolla"]]))
+        for i in range(200)
+    ]
+
+    top = scorer.top_k(LISTING, iter(buyers), 10)
+    expected = sorted(buyers, key=lambda b: scorer.score(LISTING, b), reverse=True)[:10]
+    assert [score for score, _ in top] == [scorer.score(LISTING, b) for b in expected]
+    assert [score for score, _ in top] == sorted((score for score, _ in top), reverse=True)
+
+
+def test_top_k_edge_sizes():
+    scorer = MatchScorer()
+    buyers = [_buyer(1, max_price=20000), _buyer(2, max_price=16000)]
+    assert scorer.top_k(LISTING, buyers, 0) == []
+    assert [b["id"] for _, b in scorer.top_k(LISTING, buyers, 5)] == [1, 2]
+
+
+def test_ties_keep_arrival_order():
+    scorer = MatchScorer()
+    buyers = [_buyer(i, max_price=30000) for i in range(5)]
+    assert [b["id"] for _, b in scorer.top_k(LISTING, buyers, 3)] == [0, 1, 2]
+
+
+def test_parse_weights():
+    assert parse_weights("price=1, year=0") == {"price": 1.0, "year": 0.0, "specificity": 0.2}
+    try:
+        parse_weights("colour=1")
+    except ValueError:
+        return
+    raise AssertionError("unknown weights should be rejected")
+
+
+def test_build_matches_uses_the_given_top_k():
+    service = MatchingService()
+    service.top_k = 0
+    listing = {"id": 1, **LISTING}
+    buyers = [{**_buyer(i, max_price=20000 + i), "name": "", "cell_number": ""} for i in range(5)]
+
+    ranked = service._build_matches(listing, buyers, top_k=2)
+    assert len(ranked) == 2 and all("score" in match for _, match in ranked)
+    assert len(service._build_matches(listing, buyers)) == 5
+
+    service.top_k = 3
+    assert len(service._build_matches(listing, buyers)) == 3
+    assert all("score" not in match for _, match in service._build_matches(listing, buyers, top_k=0))
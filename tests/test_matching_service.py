@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+
+from app.services.matching_service import MatchingService
+
+
+def _service(listings):
+    service = MatchingService()
+    calls = []
+
+    async def get(table, params):
+        message_id = params["telegram_message_id"].split(".", 1)[1]
+        return [row for row in listings if str(row["telegram_message_id"]) == message_id]
+
+    async def create(listing_data):
+        calls.append("create")
+        listings.append({"id": len(listings) + 1, **listing_data})
+        return {"success": True}
+
+    async def update(listing_data):
+        calls.append("update")
+        return {"success": True}
+
+    service._get = get
+    service._create_listing_and_match = create
+    service.update_listing_and_rematch = update
+    return service, calls
+
+
+def test_repeated_message_id_is_applied_as_an_edit():
+    listings = []
+    service, calls = _service(listings)
+    listing = {"telegram_message_id": 501, "product_data": {"make": "toyota", "price": 15000}}
+
+    asyncio.run(service.process_listing_and_match(listing))
+    asyncio.run(service.process_listing_and_match({**listing, "product_data": {"make": "toyota", "price": 14000}}))
+    assert calls == ["create", "update"]
+    assert len(listings) == 1
+
+    # Listings without a message id cannot be told apart, so each one is new
+    asyncio.run(service.process_listing_and_match({"product_data": {"make": "honda"}}))
+    assert calls[-1] == "create"
+
+
+def _ingest_service(insert):
+    service = MatchingService()
+    service.ingest_rpc = "ingest_listing"
+    inserted = []
+
+    async def find_candidates(listing):
+        return []
+
+    async def rpc(function, payload):
+        request = httpx.Request("POST", f"http://supabase.test/rest/v1/rpc/{function}")
+        raise httpx.HTTPStatusError("not found", request=request, response=httpx.Response(404, request=request))
+
+    async def default_insert(table, row):
+        inserted.append(table)
+        return [{"id": len(inserted), **row}]
+
+    service._find_candidates = find_candidates
+    service._rpc = rpc
+    service._insert = insert or default_insert
+    return service, inserted
+
+
+def test_missing_ingest_function_falls_back_to_separate_inserts():
+    service, inserted = _ingest_service(None)
+    result = asyncio.run(service.process_listing_and_match({"product_data": {"make": "toyota", "price": 9000}}))
+
+    assert result["success"] is True
+    assert inserted == ["listings"]
+    assert service.ingest_rpc == ""
+    assert "ingest_rpc" not in result["timings_ms"]
+
+
+def test_failed_insert_cancels_the_buyer_lookup():
+    state = {}
+
+    async def failing_insert(table, row):
+        await asyncio.sleep(0)
+        raise RuntimeError("insert failed")
+
+    async def slow_lookup(listing):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def run():
+        service, _ = _ingest_service(failing_insert)
+        service.ingest_rpc = ""
+        service._find_candidates = slow_lookup
+        result = await service.process_listing_and_match({"product_data": {"make": "toyota"}})
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(run())
+    assert result == {"success": False, "error": "insert failed"}
+    assert state.get("cancelled") is True
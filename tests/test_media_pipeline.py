@@ -0,0 +1,26 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.media_pipeline import MediaPipeline, load_message_media
+
+
+class FakeClient:
+    def __init__(self, content):
+        self.content = content
+
+    async def download_media(self, message, file):
+        with open(file, "wb") as f:
+            f.write(self.content)
+
+
+def test_same_photo_is_recorded_once_per_message(tmp_path):
+    pipeline = MediaPipeline(str(tmp_path))
+    pipeline._client = FakeClient(b"not really a jpeg")
+    message = SimpleNamespace(id=12, photo=object())
+
+    asyncio.run(pipeline._process(message))
+    asyncio.run(pipeline._process(message))
+    assert len(load_message_media(str(tmp_path), 12)["media"]) == 1
+
+    asyncio.run(pipeline._process(SimpleNamespace(id=13, photo=object())))
+    assert load_message_media(str(tmp_path), 13)["repost_of"] == [12]
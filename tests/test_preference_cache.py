@@ -0,0 +1,75 @@
+import random
+
+from app.services.preference_cache import CompiledBuyers, match_rows
+
+
+def _buyer(buyer_id, rng):
+    low = rng.randrange(0, 90000, 1000)
+    return {
+        "id": buyer_id,
+        "preferences": {
+            "make": ["toyota"],
+            "min_price": low,
+            "max_price": low + rng.randrange(1000, 40000, 1000),
+            "min_year": rng.choice([None, 2010, 2015, 2020]),
+        },
+    }
+
+
+def _listing(price, year=2016, make="toyota", model="camry"):
+    return {"product_data": {"make": make, "model": model, "price": price, "year": year}}
+
+
+def _brute_force(compiled, old, new):
+    columns = compiled.columns()
+    return [
+        row for row in range(len(compiled.buyers))
+        if match_rows(columns, row, row + 1, new) and not match_rows(columns, row, row + 1, old)
+    ]
+
+
+def _compiled(rng, count=300):
+    compiled = CompiledBuyers(1)
+    for buyer_id in range(count):
+        compiled.add(_buyer(buyer_id, rng))
+    return compiled
+
+
+def test_rows_entering_matches_brute_force():
+    rng = random.Random(5)
+    compiled = _compiled(rng)
+    old = compiled.encode_listing(_listing(30000, 2012))
+
+    for price in (5000, 25000, 30000, 45000, 80000):
+        for year in (None, 2012, 2016, 2021):
+            new = compiled.encode_listing(_listing(price, year))
+            assert compiled.rows_entering(old, new) == _brute_force(compiled, old, new)
+
+
+def test_rows_entering_after_upserts():
+    rng = random.Random(11)
+    compiled = _compiled(rng)
+    old = compiled.encode_listing(_listing(40000, 2014))
+    # Build the sorted columns, then edit buyers so they must be kept in step
+    compiled.rows_entering(old, compiled.encode_listing(_listing(20000, 2021)))
+    for _ in range(150):
+        compiled.upsert(_buyer(rng.randrange(400), rng))
+    compiled.remove(3)
+
+    for price in (10000, 20000, 60000):
+        new = compiled.encode_listing(_listing(price, 2021))
+        assert compiled.rows_entering(old, new) == _brute_force(compiled, old, new)
+
+
+def test_rows_entering_needs_full_match_when_make_changes():
+    compiled = _compiled(random.Random(1), count=10)
+    old = compiled.encode_listing(_listing(30000))
+    assert compiled.rows_entering(old, compiled.encode_listing(_listing(30000, make="honda"))) is None
+    assert compiled.rows_entering(None, old) is None
+
+
+def test_only_clear_house_searches_are_excluded():
+    compiled = CompiledBuyers(1)
+    for buyer_id, product_type in enumerate(["vehicles", "🚗 Vehicles", "Cars", None, "houses", "🏠 Houses & Stands"]):
+        compiled.add({"id": buyer_id, "preferences": {"product_type": product_type}})
+    assert sorted(compiled.row_by_id) == [0, 1, 2, 3]
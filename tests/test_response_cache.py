@@ -0,0 +1,85 @@
+import asyncio
+
+from starlette.requests import Request
+
+from app.main import _cached_json
+from app.services.response_cache import CachedResponse, ResponseCache
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = ResponseCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"matches": [1, 2]}
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_fetch("matches:1", fetch) for _ in range(5)])
+
+    entries = asyncio.run(run())
+    assert len(calls) == 1
+    assert len({entry.etag for entry in entries}) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_fetch_racing_an_invalidation_is_not_stored():
+    cache = ResponseCache()
+    versions = iter(["old", "new"])
+
+    async def fetch():
+        value = next(versions)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def run():
+        inflight = asyncio.create_task(cache.get_or_fetch("listing:1", fetch, tags=["listing:1"]))
+        await asyncio.sleep(0)
+        cache.invalidate("listing:1")
+        stale = await inflight
+        fresh = await cache.get_or_fetch("listing:1", fetch, tags=["listing:1"])
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    # The racing read still answers its caller, but the next read fetches again
+    assert stale.body == b'"old"'
+    assert fresh.body == b'"new"'
+
+
+def test_failed_fetch_is_not_cached():
+    cache = ResponseCache()
+    attempts = []
+
+    async def fetch():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("supabase down")
+        return []
+
+    async def run():
+        try:
+            await cache.get_or_fetch("listings", fetch)
+        except RuntimeError:
+            pass
+        return await cache.get_or_fetch("listings", fetch)
+
+    assert asyncio.run(run()).body == b"[]"
+    assert len(attempts) == 2
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_matching_etag_answers_304():
+    entry = CachedResponse({"matches": []}, ttl=30, tags=())
+
+    response = _cached_json(entry, _request())
+    assert response.status_code == 200
+    assert response.headers["etag"] == entry.etag
+
+    assert _cached_json(entry, _request(f'"other", {entry.etag}')).status_code == 304
+    assert _cached_json(entry, _request("*")).status_code == 304
+    assert _cached_json(entry, _request('"other"')).status_code == 200
@@ -0,0 +1,34 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import messages, preferences
+from config import Config
+
+app = FastAPI()
+app.include_router(messages.router)
+app.include_router(preferences.router)
+client = TestClient(app)
+
+
+def test_webhook_requires_secret(monkeypatch):
+    monkeypatch.setattr(Config, "BOT_WEBHOOK_SECRET", "")
+    assert client.post("/messages/telegram", json={}).status_code == 503
+
+    monkeypatch.setattr(Config, "BOT_WEBHOOK_SECRET", "s3cret")
+    assert client.post("/messages/telegram", json={}).status_code == 401
+    wrong = {"X-Telegram-Bot-Api-Secret-Token": "guess"}
+    assert client.post("/messages/telegram", json={}, headers=wrong).status_code == 401
+
+    right = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    response = client.post("/messages/telegram?deliver=false", json={}, headers=right)
+    assert response.status_code == 200
+    assert response.json() == {"replies": []}
+
+
+def test_preferences_require_api_key(monkeypatch):
+    monkeypatch.setattr(Config, "PREFERENCES_API_KEY", "key")
+    for method in ("get", "delete"):
+        assert getattr(client, method)("/preferences/1").status_code == 401
+    assert client.patch("/preferences/1", json={}, headers={"X-API-Key": "nope"}).status_code == 401
+    assert client.put("/preferences/1", json={"preferences": {"colour": "red"}},
+                      headers={"X-API-Key": "key"}).status_code == 400